@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from services.metrics import registry
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('/metrics', response_class=Response)
+async def metrics() -> Response:
+    """
+    Metrics in the Prometheus text format
+    """
+
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,128 +1,368 @@
-from typing import Any, List
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, BackgroundTasks
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import RedirectResponse
+import anyio
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from db.db import get_async_session
-from models.general import User
-from schemas.access_log import AccessLogToDBBase, AccessLogStatistic
+from sqlalchemy.orm import joinedload
+from starlette.types import Receive
+
+from core.config import app_settings
+from db.db import (async_session_maker, engine, get_async_read_session, get_async_session,
+                   read_session, track_writes)
+from models.general import AccessLog, ShortLink as ShortLinkModel
+from schemas.access_log import AccessLogBase, AccessLogStatistic, AccessLogHourly
 from schemas.short_link import (ShortLinkSchemaCreate, ShortLinkSchemaList, ShortLinkCreate,
-                                ShortLinkToDBBase, ShortLinkUpdate, LinkType)
-from services.helpers import id_generator, short_link_validation
-from services.shortlink import short_link_crud, access_log_crud
-from services.users import current_active_user
+                                ShortLinkToDBBase, ShortLinkUpdate, LinkType,
+                                ShortLinkBatchResult, ShortLinkSchemaStatus,
+                                short_link_status_items)
+from services.access_log_writer import access_log_writer
+from services.authorization import Action, access_filter, authorize
+from services.export import EXPORT_MEDIA_TYPES, export_access_logs
+from services.helpers import (short_link_validation, access_log_from_request, date_range_filters,
+                              redirect_response, url_hash)
+from services.rate_limit import rate_limit
+from services.short_code import short_code_generator
+from services.shortlink import short_link_crud, access_log_crud, click_counter_crud
+from services.principal import Principal
+from services.users import current_principal, resolve_principal
 
 
 logger = logging.getLogger()
 shorten_url_router = APIRouter()
 
+# Only the columns the listed links need, in the order of short_link_status_items
+STATUS_FIELDS = ('id', 'short_url', 'original_url', 'link_type')
+
 
 @shorten_url_router.post('/',
                          response_model=ShortLinkSchemaCreate,
-                         status_code=status.HTTP_201_CREATED
+                         status_code=status.HTTP_201_CREATED,
+                         dependencies=[Depends(track_writes), Depends(rate_limit('create'))]
                          )
 async def create_short_link(
         *,
         db: AsyncSession = Depends(get_async_session),
-        user: User = Depends(current_active_user),
+        user: Optional[Principal] = Depends(current_principal),
         link: ShortLinkCreate,
+        dedup: bool = False,
 ) -> Any:
     """
-    Create new short link
+    Create new short link.
+    With `dedup` the existing link of the same owner, type and URL is returned instead.
     """
 
-    short_link = id_generator()
+    short_link = await short_code_generator.generate()
 
     new_link = ShortLinkToDBBase(
         short_url=short_link,
         original_url=link.original_url,
         owner_id=user.id if user else None,
-        type=link.link_type if user else LinkType.PUBLIC.value
+        link_type=link.link_type if user else LinkType.PUBLIC.value
     )
+
+    if dedup:
+        new_link.url_hash = url_hash(link.original_url)
+        return await short_link_crud.get_or_create(db=db, obj_in=new_link)
+
     short_link = await short_link_crud.create(db=db, obj_in=new_link)
     return short_link
 
 
-async def redirect_logging(db: AsyncSession, history: str, short_link_id: int):
-    access_log = AccessLogToDBBase(
-        connection_info=history,
-        short_link_id=short_link_id
+async def create_links_batch(
+        db: AsyncSession,
+        user: Optional[Principal],
+        items: List[Any],
+        created: 'OrderedDict[Tuple[str, str], ShortLinkBatchResult]',
+) -> List[ShortLinkBatchResult]:
+    """
+    Create the short links of the valid items with one multi-row INSERT per chunk.
+    The same URL is shortened once: the `created` links are reused by the following
+    items and batches. Only the last `SHORT_LINK_BATCH_MAX_SIZE` of them are kept,
+    so a long NDJSON stream takes bounded memory.
+    """
+    entries: List[Union[Tuple[str, str], ShortLinkBatchResult]] = []
+    new_links: Dict[Tuple[str, str], ShortLinkToDBBase] = {}
+
+    for item in items:
+        try:
+            link = ShortLinkCreate.model_validate(item)
+        except ValidationError as e:
+            original_url = item.get('original-url') if isinstance(item, dict) else None
+            entries.append(ShortLinkBatchResult(
+                original_url=original_url if isinstance(original_url, str) else None,
+                error='; '.join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+                )
+            ))
+            continue
+
+        link_type = link.link_type if user else LinkType.PUBLIC.value
+        key = (link.original_url, link_type)
+        if key in created:
+            created.move_to_end(key)
+        elif key not in new_links:
+            new_links[key] = ShortLinkToDBBase(
+                short_url=await short_code_generator.generate(),
+                original_url=link.original_url,
+                link_type=link_type,
+                owner_id=user.id if user else None,
+            )
+        entries.append(key)
+
+    rows = await short_link_crud.create_many(
+        db=db,
+        objs_in=list(new_links.values()),
+        returning=('id', 'short_url'),
+        chunk_size=app_settings.short_link_batch_chunk_size
     )
-    await access_log_crud.create(db=db, obj_in=access_log)
+    ids = {row.short_url: row.id for row in rows}
+    for key, new_link in new_links.items():
+        created[key] = ShortLinkBatchResult(
+            original_url=new_link.original_url,
+            id=ids[new_link.short_url],
+            short_url=new_link.short_url,
+        )
 
+    logger.info(f'Created {len(new_links)} short links in a batch of {len(items)} items')
 
-@shorten_url_router.get('/{short_url}', status_code=status.HTTP_307_TEMPORARY_REDIRECT)
-async def redirect_to_link(
+    results = [created[entry] if isinstance(entry, tuple) else entry for entry in entries]
+    while len(created) > app_settings.short_link_batch_max_size:
+        created.popitem(last=False)
+    return results
+
+
+async def read_ndjson_lines(request: Request) -> AsyncIterator[Any]:
+    """
+    Parse the request body lines as they arrive, the invalid ones are given as None
+    """
+    buffer = b''
+
+    async for data in request.stream():
+        *lines, buffer = (buffer + data).split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_line(line)
+
+    if buffer.strip():
+        yield parse_ndjson_line(buffer)
+
+
+def parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+
+
+async def read_ndjson_chunks(request: Request, chunk_size: int) -> AsyncIterator[List[Any]]:
+    chunk: List[Any] = []
+
+    async for item in read_ndjson_lines(request):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streamed response made while the request body is still being read by its iterator.
+    The request messages are left to the iterator, which gets the client disconnect
+    as ClientDisconnect.
+    """
+
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        await anyio.sleep_forever()
+
+
+async def stream_links_batch(
+        user: Optional[Principal], request: Request
+) -> AsyncIterator[bytes]:
+    """
+    Create the short links of the NDJSON request chunk by chunk and yield the results
+    of every chunk as it is committed
+    """
+    created: 'OrderedDict[Tuple[str, str], ShortLinkBatchResult]' = OrderedDict()
+
+    # The response is streamed after the dependencies are closed, so it has its own session
+    async with async_session_maker() as db:
+        async for chunk in read_ndjson_chunks(request, app_settings.short_link_batch_chunk_size):
+            yield b''.join(
+                result.model_dump_json(by_alias=True, exclude_none=True).encode() + b'\n'
+                for result in await create_links_batch(db, user, chunk, created)
+            )
+
+
+@shorten_url_router.post(
+    '/shorten',
+    response_model=List[ShortLinkBatchResult],
+    response_model_exclude_none=True,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(track_writes), Depends(rate_limit('batch'))],
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {'schema': {
+                    'type': 'array',
+                    'items': ShortLinkCreate.model_json_schema(),
+                }},
+                'application/x-ndjson': {'schema': ShortLinkCreate.model_json_schema()},
+            },
+        },
+    },
+)
+async def create_short_links_batch(
         *,
         db: AsyncSession = Depends(get_async_session),
+        user: Optional[Principal] = Depends(current_principal),
+        request: Request,
+) -> Any:
+    """
+    Create short links in a batch: a JSON list of up to `SHORT_LINK_BATCH_MAX_SIZE` links
+    or an NDJSON stream of any length, which is answered with NDJSON.
+    Every item gets its result or error in the same position, the same URL is shortened once.
+    """
+    if request.headers.get('content-type', '').startswith('application/x-ndjson'):
+        return DuplexStreamingResponse(
+            stream_links_batch(user, request),
+            status_code=status.HTTP_201_CREATED,
+            media_type='application/x-ndjson'
+        )
+
+    try:
+        items = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Invalid JSON'
+        )
+
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail='Expected a list of links'
+        )
+
+    if len(items) > app_settings.short_link_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f'Up to {app_settings.short_link_batch_max_size} links per batch, '
+                   f'send the bigger ones as NDJSON'
+        )
+
+    return await create_links_batch(db, user, items, OrderedDict())
+
+
+@shorten_url_router.get('/{short_url}',
+                        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                        dependencies=[Depends(rate_limit('redirect', authenticated=False))]
+                        )
+async def redirect_to_link(
+        *,
         request: Request,
-        background_tasks: BackgroundTasks,
-        user: User = Depends(current_active_user),
         short_url: str
 ) -> Any:
     """
-    Redirect by short link
+    Redirect by short link.
+    The hot path: no session and no user are needed for the cached public links,
+    the user is resolved only for the private ones.
+    The misses are read from the primary, as they fill the cache.
     """
-    short_link = await short_link_crud.get(db=db, short_url=short_url)
+    short_link = await short_link_crud.get_cached(short_url)
+    if short_link is None:
+        async with engine.connect() as connection:
+            short_link = await short_link_crud.load(db=connection, short_url=short_url)
 
     short_link_validation(short_link)
 
-    if short_link.link_type == 'private':
-        if not user or user != short_link.owner:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
-            )
-
-    history = str(jsonable_encoder(request.headers))
+    if short_link.link_type == LinkType.PRIVATE.value:
+        authorize(await resolve_principal(request), short_link, Action.READ)
 
-    background_tasks.add_task(redirect_logging, db, history, short_link.id)
+    await access_log_writer.submit(access_log_from_request(request, short_link.id))
 
     logger.info(f'Redirect by the short link ({short_url}) to the url ({short_link.original_url})')
 
-    return RedirectResponse(url=short_link.original_url)
+    return redirect_response(short_link.original_url)
 
 
-@shorten_url_router.get('/user/status', response_model=List[ShortLinkSchemaList])
+@shorten_url_router.get(
+    '/user/status',
+    response_model=List[ShortLinkSchemaStatus],
+    response_model_exclude_none=True,
+)
 async def user_status(
-        db: AsyncSession = Depends(get_async_session),
-        user: User = Depends(current_active_user),
+        *,
+        cursor: Optional[int] = None,
+        limit: int = Query(
+            100, alias='max-result', ge=1, le=app_settings.user_links_page_max_size
+        ),
+        link_type: Optional[LinkType] = Query(None, alias='type'),
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        clicks: bool = False,
+        db: AsyncSession = Depends(get_async_read_session),
+        user: Optional[Principal] = Depends(current_principal),
 ) -> Any:
     """
-    Get the list of user's short links
+    Get the list of user's short links, `max-result` of them at a time in the creation order.
+    Pass the `X-Next-Cursor` header of the response as `cursor` to get the next page.
+    With `clicks` every link comes with the number of its usages.
     """
     if not user:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
         )
 
-    short_links = await short_link_crud.get_multi(db=db, owner_id=user.id, is_active=True)
+    params = {'link_type': link_type.value} if link_type is not None else {}
+    short_links = await short_link_crud.get_page(
+        db=db,
+        fields=STATUS_FIELDS,
+        after_id=cursor,
+        limit=limit,
+        filters=[
+            access_filter(user, Action.CHANGE),
+            *date_range_filters(ShortLinkModel.create_at, date_from, date_to),
+        ],
+        with_clicks=clicks,
+        is_active=True,
+        **params
+    )
+
+    headers = {}
+    if len(short_links) == limit:
+        headers['X-Next-Cursor'] = str(short_links[-1].id)
 
-    return short_links
+    # The response model documents the list, the rows are serialized without it
+    return ORJSONResponse(short_link_status_items(short_links, clicks), headers=headers)
 
 
-@shorten_url_router.delete('/{short_url}')
+@shorten_url_router.delete('/{short_url}', dependencies=[Depends(track_writes)])
 async def delete_link(
         *,
         db: AsyncSession = Depends(get_async_session),
-        user: User = Depends(current_active_user),
+        user: Optional[Principal] = Depends(current_principal),
         short_url: str
 ) -> Any:
     """
     Delete short link
     """
-    short_link = await short_link_crud.get(db=db, short_url=short_url)
+    short_link = await short_link_crud.get_fields(
+        db=db, fields=('id', 'short_url', 'owner_id', 'link_type', 'is_active'),
+        short_url=short_url
+    )
 
     short_link_validation(short_link)
 
-    if short_link.owner:
-        if not user or user != short_link.owner:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
-            )
+    authorize(user, short_link, Action.DELETE)
 
     await short_link_crud.soft_delete(db=db, db_obj=short_link)
 
@@ -133,12 +373,13 @@ async def delete_link(
 
 @shorten_url_router.put('/{short_url}',
                         response_model=ShortLinkSchemaList,
-                        status_code=status.HTTP_202_ACCEPTED
+                        status_code=status.HTTP_202_ACCEPTED,
+                        dependencies=[Depends(track_writes)]
                         )
 async def update_link(
         *,
         db: AsyncSession = Depends(get_async_session),
-        user: User = Depends(current_active_user),
+        user: Optional[Principal] = Depends(current_principal),
         short_url: str,
         type_data: ShortLinkUpdate
 ) -> Any:
@@ -149,10 +390,7 @@ async def update_link(
 
     short_link_validation(short_link)
 
-    if not user or user != short_link.owner:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
-        )
+    authorize(user, short_link, Action.CHANGE)
 
     if type_data.link_type not in LinkType.items():
         acceptable_types = ', '.join(LinkType.items())
@@ -178,42 +416,116 @@ async def update_link(
 async def get_link_statistic(
         *,
         full_info: str = None,
-        offset: int = 0,
+        offset: int = Query(0, deprecated=True),
+        cursor: Optional[int] = None,
         limit: int = Query(10, alias='max-result'),
-        db: AsyncSession = Depends(get_async_session),
-        user: User = Depends(current_active_user),
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        db: AsyncSession = Depends(get_async_read_session),
+        user: Optional[Principal] = Depends(current_principal),
         short_url: str,
 ) -> Any:
     """
     Get the history of short link usage.
+    Pass `next_cursor` of the response as `cursor` to get the next page of the logs.
+    The logs out of `date_from` - `date_to` range are skipped without reading their partitions.
     """
-    short_link = await short_link_crud.get(db=db, short_url=short_url)
+    short_link = await short_link_crud.resolve(db=db, short_url=short_url)
 
     short_link_validation(short_link)
 
-    if short_link.link_type == 'private':
-        if not user or user != short_link.owner:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
-            )
-
-    access_logs_for_count = await access_log_crud.get_multi(
-        db=db,
-        short_link_id=short_link.id
-    )
+    authorize(user, short_link, Action.READ)
 
     access_log_statistic = AccessLogStatistic(
-        requests_count=len(access_logs_for_count)
+        requests_count=await click_counter_crud.get_total(db=db, short_link_id=short_link.id)
     )
 
-    access_logs = await access_log_crud.get_multi(
+    if isinstance(full_info, str):
+        access_logs = await access_log_crud.get_multi(
+            db=db,
+            offset=None if cursor is not None else offset,
+            after_id=cursor,
+            limit=limit,
+            options=[joinedload(AccessLog.user_agent), joinedload(AccessLog.referer)],
+            filters=date_range_filters(AccessLog.create_at, date_from, date_to),
+            short_link_id=short_link.id
+        )
+        access_log_statistic.logs = [
+            AccessLogBase.model_validate(access_log) for access_log in access_logs
+        ]
+
+        if access_logs and len(access_logs) == limit:
+            access_log_statistic.next_cursor = access_logs[-1].id
+
+    return access_log_statistic
+
+
+@shorten_url_router.get('/{short_url}/timeseries', response_model=List[AccessLogHourly])
+async def get_link_timeseries(
+        *,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        db: AsyncSession = Depends(get_async_read_session),
+        user: Optional[Principal] = Depends(current_principal),
+        short_url: str,
+) -> Any:
+    """
+    Get the number of the short link usages per hour.
+    """
+    short_link = await short_link_crud.resolve(db=db, short_url=short_url)
+
+    short_link_validation(short_link)
+
+    authorize(user, short_link, Action.READ)
+
+    return await click_counter_crud.get_hourly(
         db=db,
-        offset=offset,
-        limit=limit,
-        short_link_id=short_link.id
+        short_link_id=short_link.id,
+        date_from=date_from,
+        date_to=date_to
     )
 
-    if isinstance(full_info, str):
-        access_log_statistic.logs = access_logs
 
-    return access_log_statistic
+@shorten_url_router.get(
+    '/{short_url}/export',
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            'content': {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}
+        }
+    },
+)
+async def export_link_statistic(
+        *,
+        export_format: str = Query('ndjson', alias='format', pattern='^(ndjson|csv)$'),
+        after_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        db: AsyncSession = Depends(get_async_read_session),
+        user: Optional[Principal] = Depends(current_principal),
+        short_url: str,
+        request: Request,
+) -> Any:
+    """
+    Export the whole history of short link usage as NDJSON or CSV, ordered by id.
+    An interrupted export is resumed by passing the last received id as `after_id`.
+    """
+    short_link = await short_link_crud.resolve(db=db, short_url=short_url)
+
+    short_link_validation(short_link)
+
+    authorize(user, short_link, Action.READ)
+
+    logger.info(f'Export of the short link ({short_url}) usage history as {export_format}')
+
+    return StreamingResponse(
+        export_access_logs(
+            session=read_session(request),
+            short_link_id=short_link.id,
+            export_format=export_format,
+            after_id=after_id,
+            filters=date_range_filters(AccessLog.create_at, date_from, date_to),
+        ),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{short_url}.{export_format}"'},
+    )
@@ -1,10 +1,15 @@
+import time
 from typing import Any
 
 from fastapi import APIRouter, Depends
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.db import get_async_session
+from db.db import engine, get_async_session, session_router
 from schemas.users import UserRead, UserCreate
+from services.blacklist import ip_blacklist
+from services.rate_limit import rate_limiter
+from services.shortlink import link_cache
 from services.users import fastapi_users, auth_backend
 
 api_router = APIRouter()
@@ -26,15 +31,55 @@ api_router.include_router(
 async def ping_db(
         *,
         db: AsyncSession = Depends(get_async_session),
+        detailed: bool = False,
 ) -> Any:
     """
-    Check DB connection status
+    Check DB connection status.
+    With `detailed` also get the query round trip time and the connection pool counters.
     """
 
     try:
-        await db.connection()
+        started = time.perf_counter()
+        await db.execute(text('SELECT 1'))
+        round_trip = time.perf_counter() - started
         connection_status = True
     except Exception:
+        round_trip = None
         connection_status = False
 
-    return {'Connected': connection_status}
+    if not detailed:
+        return {'Connected': connection_status}
+
+    return {
+        'Connected': connection_status,
+        'round_trip_ms': round_trip * 1000 if round_trip is not None else None,
+        'pool': engine.pool.stats(),
+        'replicas': session_router.stats(),
+    }
+
+
+@api_router.get('/cache', tags=['main'])
+async def cache_stats() -> Any:
+    """
+    Get the short link cache counters
+    """
+
+    return link_cache.stats()
+
+
+@api_router.get('/rate-limit', tags=['main'])
+async def rate_limit_stats() -> Any:
+    """
+    Get the rate limiter backend counters and the number of the throttled requests
+    """
+
+    return rate_limiter.stats()
+
+
+@api_router.get('/blacklist', tags=['main'])
+async def blacklist_stats() -> Any:
+    """
+    Get the number of the black list rules and the most hit ones
+    """
+
+    return ip_blacklist.stats()
@@ -0,0 +1,50 @@
+"""
+Black list lookup time depending on the number of the rules,
+against the former membership test in a list of addresses.
+
+    PYTHONPATH=src python -m benchmarks.blacklist_lookup
+"""
+import ipaddress
+import random
+import time
+
+from services.blacklist import IPBlacklist
+
+RULE_COUNTS = (100, 10000, 50000)
+LOOKUPS = 100000
+
+
+def random_network() -> str:
+    address = ipaddress.IPv4Address(random.getrandbits(32))
+    return str(ipaddress.ip_network(f'{address}/{random.randint(16, 32)}', strict=False))
+
+
+def per_lookup_us(lookup, hosts) -> float:
+    started = time.perf_counter()
+    for host in hosts:
+        lookup(host)
+    return (time.perf_counter() - started) / len(hosts) * 10 ** 6
+
+
+def main():
+    random.seed(42)
+    hosts = [str(ipaddress.IPv4Address(random.getrandbits(32))) for _ in range(LOOKUPS)]
+
+    print(f'{"rules":>8} {"build, ms":>10} {"lookup, us":>11} {"list lookup, us":>16}')
+    for rule_count in RULE_COUNTS:
+        entries = [random_network() for _ in range(rule_count)]
+
+        started = time.perf_counter()
+        blacklist = IPBlacklist(entries=entries)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        addresses = [entry.split('/')[0] for entry in entries]
+        print(
+            f'{rule_count:>8} {build_ms:>10.1f} '
+            f'{per_lookup_us(blacklist.match, hosts):>11.2f} '
+            f'{per_lookup_us(addresses.__contains__, hosts[:1000]):>16.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
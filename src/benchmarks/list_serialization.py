@@ -0,0 +1,81 @@
+"""
+Serialization of the /user/status lists: the response model validated row by row,
+as FastAPI does, against the dicts built straight from the rows.
+No database is needed, the rows are made up.
+
+    PYTHONPATH=src python -m benchmarks.list_serialization
+"""
+import argparse
+import time
+from collections import namedtuple
+from typing import Callable, Dict, List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from benchmarks import report
+from schemas.short_link import ShortLinkSchemaStatus, short_link_status_items
+
+StatusRow = namedtuple('StatusRow', ('id', 'short_url', 'original_url', 'link_type', 'clicks'))
+
+
+def make_rows(count: int) -> List[StatusRow]:
+    return [
+        StatusRow(i, f'code{i:07}', f'http://bench.example.com/{i}', 'public', i % 100)
+        for i in range(count)
+    ]
+
+
+status_list = TypeAdapter(List[ShortLinkSchemaStatus])
+
+
+def response_model(rows: List[StatusRow]) -> bytes:
+    links = status_list.validate_python(rows, from_attributes=True)
+    return orjson.dumps(jsonable_encoder(links, by_alias=True, exclude_none=True))
+
+
+def row_dicts(rows: List[StatusRow]) -> bytes:
+    return orjson.dumps(short_link_status_items(rows, with_clicks=True))
+
+
+def measure(func: Callable[[List[StatusRow]], bytes], rows: List[StatusRow],
+            repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        timings.append(time.perf_counter() - started)
+
+    result = report.summarize(timings, sum(timings))
+    result['rows_per_second'] = len(rows) * repeat / sum(timings)
+    return result
+
+
+def main(args: argparse.Namespace) -> None:
+    results = {}
+    for count in args.rows:
+        rows = make_rows(count)
+        assert orjson.loads(response_model(rows[:10])) == orjson.loads(row_dicts(rows[:10]))
+
+        for name, func in (('response_model', response_model), ('row_dicts', row_dicts)):
+            results[f'{name}_{count}'] = measure(func, rows, args.repeat)
+
+    report.print_table(results)
+    for count in args.rows:
+        speedup = (
+            results[f'row_dicts_{count}']['throughput_rps']
+            / results[f'response_model_{count}']['throughput_rps']
+        )
+        print(f'{count} rows: x{speedup:.1f} faster')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5, help='at least 2')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
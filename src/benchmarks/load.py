@@ -0,0 +1,153 @@
+"""
+Load test of the hot endpoints through the ASGI client, at a fixed concurrency,
+against the seeded benchmark dataset (see benchmarks.seed).
+
+Run against a migrated database:
+    PYTHONPATH=src python -m benchmarks.load --output results.json
+Flag the regressions against the stored results:
+    PYTHONPATH=src python -m benchmarks.load --baseline results.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from httpx import AsyncClient
+
+from benchmarks import report
+from benchmarks.seed import PREFIX, Dataset, cleanup, seed
+from db.db import engine
+from main import app
+from services.access_log_writer import access_log_writer
+from services.rate_limit import rate_limiter
+
+Request = Callable[[AsyncClient], Awaitable[int]]
+
+
+async def run_scenario(
+        client: AsyncClient, request: Request, requests: int, concurrency: int
+) -> Dict[str, float]:
+    timings: List[float] = []
+    errors = 0
+    remaining = itertools.count(requests, -1)
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) > 0:
+            started = time.perf_counter()
+            status_code = await request(client)
+            timings.append(time.perf_counter() - started)
+            if status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return report.summarize(timings, time.perf_counter() - started, errors)
+
+
+def zipf_choice(short_urls: List[str], exponent: float) -> Callable[[], str]:
+    weights = list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, len(short_urls) + 1)
+    ))
+    return lambda: random.choices(short_urls, cum_weights=weights)[0]
+
+
+async def login(client: AsyncClient) -> Dict[str, str]:
+    user = {'email': f'{PREFIX}load@example.com', 'password': 'benchmark'}
+    await client.post('/api/v1/auth/register', json=user)
+    response = await client.post(
+        '/api/v1/auth/jwt/login', data={'username': user['email'], 'password': user['password']}
+    )
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+
+async def main(args: argparse.Namespace) -> int:
+    # The scenarios measure the endpoints, not the throttling
+    rate_limiter.limits = {}
+    dataset = Dataset(
+        users=args.users, links=args.links, access_logs=args.access_logs,
+        zipf_exponent=args.zipf_exponent
+    )
+    short_urls = await seed(engine, dataset)
+    choose = zipf_choice(short_urls, dataset.zipf_exponent)
+    new_urls = itertools.count()
+
+    try:
+        async with AsyncClient(app=app, base_url='http://test') as client:
+            headers = await login(client)
+
+            async def create(client: AsyncClient) -> int:
+                response = await client.post('/', json={
+                    'original-url': f'http://bench.example.com/new/{next(new_urls)}'
+                })
+                return response.status_code
+
+            async def redirect(client: AsyncClient) -> int:
+                return (await client.get(f'/{choose()}')).status_code
+
+            async def link_status(client: AsyncClient) -> int:
+                return (await client.get(f'/{choose()}/status')).status_code
+
+            async def user_status(client: AsyncClient) -> int:
+                return (await client.get('/user/status', headers=headers)).status_code
+
+            results = {'dataset': vars(dataset)}
+            for name, request in (
+                    ('create', create),
+                    ('redirect', redirect),
+                    ('link_status', link_status),
+                    ('user_status', user_status),
+            ):
+                results[name] = await run_scenario(
+                    client, request, args.requests, args.concurrency
+                )
+                results[name]['concurrency'] = args.concurrency
+    finally:
+        await access_log_writer.stop()
+        await cleanup(engine)
+        await engine.dispose()
+
+    report.print_table(results)
+    if args.output:
+        report.save(results, args.output)
+
+    return check(results, args)
+
+
+def check(results: Dict[str, Dict], args: argparse.Namespace) -> int:
+    """
+    Print the failed scenarios and the regressions, if any: both fail the run
+    """
+    failures = report.failures(results)
+    for failure in failures:
+        print(f'ERRORS {failure}')
+
+    regressions = []
+    if args.baseline:
+        regressions = report.compare(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+
+    return 1 if failures or regressions else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--links', type=int, default=10000)
+    parser.add_argument('--access-logs', type=int, default=200000)
+    parser.add_argument('--zipf-exponent', type=float, default=1.1)
+    parser.add_argument('--requests', type=int, default=2000, help='per endpoint')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed degradation against the baseline, as a fraction')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,115 @@
+"""
+Micro-benchmarks of the per-request building blocks: short code generation,
+schema serialization and query building.
+
+    PYTHONPATH=src python -m benchmarks.micro --output micro.json
+    PYTHONPATH=src python -m benchmarks.micro --baseline micro.json --threshold 0.2
+"""
+import argparse
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from benchmarks import report
+from models.general import AccessLog, ShortLink
+from schemas.access_log import AccessLogStatistic
+from schemas.short_link import ShortLinkSchemaList
+from services.base import set_params
+from services.helpers import id_generator
+from services.short_code import ShortCodeEncoder
+
+SAMPLES = 100
+
+
+def measure(func: Callable[[], object], calls_per_sample: int = 100) -> Dict[str, float]:
+    """
+    Time `SAMPLES` samples of `calls_per_sample` calls, the percentiles are per call
+    """
+    timings = []
+    started = time.perf_counter()
+    for _ in range(SAMPLES):
+        sample_started = time.perf_counter()
+        for _ in range(calls_per_sample):
+            func()
+        timings.append((time.perf_counter() - sample_started) / calls_per_sample)
+
+    result = report.summarize(timings, time.perf_counter() - started)
+    result['ops_per_second'] = SAMPLES * calls_per_sample / (time.perf_counter() - started)
+    del result['throughput_rps'], result['requests'], result['errors']
+    return result
+
+
+def main(args: argparse.Namespace) -> int:
+    encoder = ShortCodeEncoder(min_length=7)
+    numbers = iter(range(10 ** 9))
+
+    short_links = [
+        ShortLink(
+            id=i, short_url=f'code{i}', original_url=f'http://example.com/{i}',
+            link_type='public', owner_id=uuid.uuid4(), is_active=True
+        )
+        for i in range(100)
+    ]
+    access_logs = [
+        AccessLog(id=i, short_link_id=1, client_ip='10.0.0.1', create_at=datetime.utcnow())
+        for i in range(100)
+    ]
+    for access_log in access_logs:
+        access_log.user_agent = access_log.referer = None
+
+    def serialize_short_links():
+        return jsonable_encoder(
+            [ShortLinkSchemaList.model_validate(short_link) for short_link in short_links],
+            by_alias=True
+        )
+
+    def serialize_statistic():
+        return AccessLogStatistic(requests_count=100, logs=access_logs).model_dump_json()
+
+    def build_query():
+        return set_params(
+            select(ShortLink), ShortLink, {'owner_id': uuid.uuid4(), 'is_active': True}
+        )
+
+    def compile_query():
+        return build_query().compile(dialect=postgresql.dialect())
+
+    results = {
+        'id_generator': measure(id_generator),
+        'short_code_encode': measure(lambda: encoder.encode(next(numbers))),
+        'short_link_list_100': measure(serialize_short_links, calls_per_sample=2),
+        'access_log_statistic_100': measure(serialize_statistic, calls_per_sample=2),
+        'set_params_build': measure(build_query, calls_per_sample=20),
+        'set_params_compile': measure(compile_query, calls_per_sample=5),
+    }
+
+    report.print_table(results)
+    if args.output:
+        report.save(results, args.output)
+
+    if args.baseline:
+        regressions = report.compare(results, args.baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed degradation against the baseline, as a fraction')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
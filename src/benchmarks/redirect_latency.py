@@ -0,0 +1,84 @@
+"""
+Redirect lookup latency depending on the number of the link's clicks.
+
+Run against a migrated database:
+    PYTHONPATH=src python -m benchmarks.redirect_latency
+"""
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import selectinload
+
+from db.db import async_session_maker
+from models.general import AccessLog, ShortLink
+from services.cache import CachedLink
+from services.helpers import id_generator
+from services.shortlink import short_link_crud
+
+CLICK_COUNTS = (0, 1000, 10000, 20000)
+ROUNDS = 50
+
+
+async def measure(func) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def main():
+    async with async_session_maker() as db:
+        short_link = ShortLink(short_url=id_generator(10), original_url='http://example.com')
+        db.add(short_link)
+        await db.commit()
+
+        clicks = 0
+        print(f'{"clicks":>8} {"eager graph, ms":>16} {"entity, ms":>12} {"columns, ms":>12}')
+        try:
+            for click_count in CLICK_COUNTS:
+                if click_count > clicks:
+                    await db.execute(
+                        insert(AccessLog),
+                        [
+                            {'short_link_id': short_link.id, 'connection_info': 'benchmark'}
+                            for _ in range(click_count - clicks)
+                        ]
+                    )
+                    await db.commit()
+                    clicks = click_count
+
+                async def eager_graph():
+                    db.expunge_all()
+                    await short_link_crud.get(
+                        db=db,
+                        short_url=short_link.short_url,
+                        options=[
+                            selectinload(ShortLink.connections), selectinload(ShortLink.owner)
+                        ]
+                    )
+
+                async def entity():
+                    db.expunge_all()
+                    await short_link_crud.get(db=db, short_url=short_link.short_url)
+
+                async def columns():
+                    await short_link_crud.get_fields(
+                        db=db, fields=CachedLink._fields, short_url=short_link.short_url
+                    )
+
+                print(
+                    f'{click_count:>8} {await measure(eager_graph):>16.3f} '
+                    f'{await measure(entity):>12.3f} {await measure(columns):>12.3f}'
+                )
+        finally:
+            await db.execute(delete(AccessLog).where(AccessLog.short_link_id == short_link.id))
+            await db.execute(delete(ShortLink).where(ShortLink.id == short_link.id))
+            await db.commit()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
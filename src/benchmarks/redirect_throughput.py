@@ -0,0 +1,138 @@
+"""
+Redirect throughput of the fast path against the previous handler, which resolved
+the user and opened the ORM session for every redirect and answered with RedirectResponse.
+Both handlers run in one application without the middlewares and the rate limits,
+for the anonymous and the authenticated clients of a cached public link.
+
+Run against a migrated database:
+    PYTHONPATH=src python -m benchmarks.redirect_throughput
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse, RedirectResponse
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.shorten_url import shorten_url_router
+from api.v1 import base
+from benchmarks import report
+from benchmarks.seed import PREFIX, cleanup
+from db.db import async_session_maker, engine, get_async_read_session
+from models.general import ShortLink, User
+from services.access_log_writer import access_log_writer
+from services.helpers import access_log_from_request, short_link_validation
+from services.rate_limit import rate_limiter
+from services.shortlink import short_link_crud
+from services.users import current_active_user
+
+legacy_router = APIRouter()
+
+
+@legacy_router.get('/legacy/{short_url}', status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+async def legacy_redirect_to_link(
+        *,
+        db: AsyncSession = Depends(get_async_read_session),
+        request: Request,
+        user: User = Depends(current_active_user),
+        short_url: str
+) -> Any:
+    short_link = await short_link_crud.resolve(db=db, short_url=short_url)
+
+    short_link_validation(short_link)
+
+    if short_link.link_type == 'private':
+        if not user or user.id != short_link.owner_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
+            )
+
+    await access_log_writer.submit(access_log_from_request(request, short_link.id))
+
+    return RedirectResponse(url=short_link.original_url)
+
+
+bench_app = FastAPI(default_response_class=ORJSONResponse)
+bench_app.include_router(base.api_router, prefix='/api/v1')
+bench_app.include_router(legacy_router)
+bench_app.include_router(shorten_url_router)
+
+
+async def run(client: AsyncClient, url: str, headers: Dict[str, str],
+              requests: int, concurrency: int) -> Dict[str, float]:
+    timings: List[float] = []
+    errors = 0
+    remaining = itertools.count(requests, -1)
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) > 0:
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != status.HTTP_307_TEMPORARY_REDIRECT:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return report.summarize(timings, time.perf_counter() - started, errors)
+
+
+async def main(args: argparse.Namespace) -> None:
+    rate_limiter.limits = {}
+    user = {'email': f'{PREFIX}redirect@example.com', 'password': 'benchmark'}
+    short_url = f'{PREFIX}redirect'
+
+    results = {}
+    try:
+        async with async_session_maker() as db:
+            db.add(ShortLink(
+                short_url=short_url, original_url='http://bench.example.com/redirect'
+            ))
+            await db.commit()
+
+        async with AsyncClient(app=bench_app, base_url='http://test') as client:
+            await client.post('/api/v1/auth/register', json=user)
+            response = await client.post(
+                '/api/v1/auth/jwt/login',
+                data={'username': user['email'], 'password': user['password']}
+            )
+            token = {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+            for client_name, headers in (('anonymous', {}), ('authenticated', token)):
+                for handler, url in (
+                        ('legacy', f'/legacy/{short_url}'), ('fast', f'/{short_url}')
+                ):
+                    # Warm up the link cache and the connections
+                    await run(client, url, headers, args.concurrency, args.concurrency)
+                    results[f'{handler}_{client_name}'] = await run(
+                        client, url, headers, args.requests, args.concurrency
+                    )
+                await access_log_writer.join()
+    finally:
+        await access_log_writer.stop()
+        await cleanup(engine)
+        await engine.dispose()
+
+    report.print_table(results)
+    for failure in report.failures(results):
+        print(f'ERRORS {failure}')
+    for client_name in ('anonymous', 'authenticated'):
+        legacy, fast = results[f'legacy_{client_name}'], results[f'fast_{client_name}']
+        speedup = fast['throughput_rps'] / legacy['throughput_rps']
+        print(f'{client_name}: x{speedup:.2f} throughput')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000, help='per scenario')
+    parser.add_argument('--concurrency', type=int, default=20)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,85 @@
+"""
+Percentiles, JSON results and the comparison with a stored baseline,
+shared by the benchmarks.
+"""
+import json
+import statistics
+from typing import Dict, List, Sequence
+
+# Lower is better for the latencies, higher is better for the throughput
+LATENCY_KEYS = ('p50_ms', 'p95_ms', 'p99_ms')
+THROUGHPUT_KEYS = ('throughput_rps', 'ops_per_second')
+
+
+def summarize(timings: Sequence[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """
+    Summarize the timings (in seconds) of the operations run within `elapsed` seconds
+    """
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput_rps': len(timings) / elapsed,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+    }
+
+
+def save(results: Dict[str, Dict], path: str) -> None:
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def compare(results: Dict[str, Dict], baseline_path: str, threshold: float) -> List[str]:
+    """
+    Get the regressions: the latencies grown or the throughputs dropped
+    by more than `threshold` (a fraction) against the baseline
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if not isinstance(expected, dict):
+            continue
+
+        expected_errors = expected.get('errors', 0)
+        if result.get('errors', 0) > expected_errors:
+            regressions.append(f'{name} errors: {result["errors"]} against {expected_errors}')
+
+        for key in (*LATENCY_KEYS, *THROUGHPUT_KEYS):
+            if key not in result or key not in expected:
+                continue
+            if key in LATENCY_KEYS:
+                regressed = result[key] > expected[key] * (1 + threshold)
+            else:
+                regressed = result[key] < expected[key] * (1 - threshold)
+            if regressed:
+                regressions.append(f'{name} {key}: {result[key]:.3f} against {expected[key]:.3f}')
+
+    return regressions
+
+
+def failures(results: Dict[str, Dict]) -> List[str]:
+    """
+    Get the scenarios with failed requests, whose timings are not comparable
+    """
+    return [
+        f'{name}: {result["errors"]} of {result["requests"]} requests failed'
+        for name, result in results.items()
+        if isinstance(result, dict) and result.get('errors')
+    ]
+
+
+def print_table(results: Dict[str, Dict]) -> None:
+    print(f'{"benchmark":>24} {"ops/s":>10} {"p50, ms":>9} {"p95, ms":>9} {"p99, ms":>9}')
+    for name, result in results.items():
+        if not isinstance(result, dict) or 'p50_ms' not in result:
+            continue
+        throughput = result.get('throughput_rps', result.get('ops_per_second', 0))
+        print(
+            f'{name:>24} {throughput:>10.1f} {result["p50_ms"]:>9.3f} '
+            f'{result["p95_ms"]:>9.3f} {result["p99_ms"]:>9.3f}'
+        )
@@ -0,0 +1,143 @@
+"""
+Validation and serialization of the response schemas: the pydantic v1 schemas,
+kept here as they were before the port, against the v2 schemas of `schemas`.
+No database is needed, the rows are made up.
+
+    PYTHONPATH=src python -m benchmarks.schema_serialization
+"""
+import argparse
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+from pydantic import TypeAdapter, v1
+
+from benchmarks import report
+from core.public_url import short_url_of
+from schemas.access_log import AccessLogStatistic
+from schemas.short_link import ShortLinkSchemaList
+
+LinkRow = namedtuple('LinkRow', ('id', 'short_url', 'original_url', 'link_type'))
+LogRow = namedtuple('LogRow', ('connection_info', 'create_at'))
+
+
+class ShortLinkSchemaListV1(v1.BaseModel):
+    id: int = v1.Field(alias='short-id')
+    short_url: str = v1.Field(alias='short-url')
+    original_url: v1.AnyUrl = v1.Field(alias='original-url')
+    link_type: str = v1.Field(alias='type')
+
+    @v1.root_validator
+    def compute_area(cls, values) -> Dict:
+        values['short_url'] = short_url_of(values.get('short_url'))
+        return values
+
+    class Config:
+        orm_mode = True
+        allow_population_by_field_name = True
+
+
+class AccessLogBaseV1(v1.BaseModel):
+    connection_info: str
+    create_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class AccessLogStatisticV1(v1.BaseModel):
+    requests_count: int = 0
+    logs: Optional[List[AccessLogBaseV1]] = None
+    next_cursor: Optional[int] = None
+
+
+def make_links(count: int) -> List[LinkRow]:
+    return [
+        LinkRow(i, f'code{i:07}', f'http://bench.example.com/{i}', 'public')
+        for i in range(count)
+    ]
+
+
+def make_logs(count: int) -> List[LogRow]:
+    started = datetime(2023, 1, 1)
+    return [
+        LogRow(
+            orjson.dumps({'client-ip': '127.0.0.1', 'user-agent': f'bench/{i}'}).decode(),
+            started + timedelta(seconds=i)
+        )
+        for i in range(count)
+    ]
+
+
+link_list = TypeAdapter(List[ShortLinkSchemaList])
+
+
+def links_v1(rows: List[LinkRow]) -> bytes:
+    links = [ShortLinkSchemaListV1.from_orm(row) for row in rows]
+    return orjson.dumps([link.dict(by_alias=True) for link in links])
+
+
+def links_v2(rows: List[LinkRow]) -> bytes:
+    links = link_list.validate_python(rows, from_attributes=True)
+    return link_list.dump_json(links, by_alias=True)
+
+
+def statistic_v1(rows: List[LogRow]) -> bytes:
+    statistic = AccessLogStatisticV1(
+        requests_count=len(rows), logs=[AccessLogBaseV1.from_orm(row) for row in rows]
+    )
+    return statistic.json().encode()
+
+
+def statistic_v2(rows: List[LogRow]) -> bytes:
+    statistic = AccessLogStatistic.model_validate(
+        {'requests_count': len(rows), 'logs': rows}, from_attributes=True
+    )
+    return statistic.model_dump_json().encode()
+
+
+def measure(func: Callable[[List[Any]], bytes], rows: List[Any],
+            repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        timings.append(time.perf_counter() - started)
+
+    result = report.summarize(timings, sum(timings))
+    result['rows_per_second'] = len(rows) * repeat / sum(timings)
+    return result
+
+
+def main(args: argparse.Namespace) -> None:
+    cases = {
+        'links': (make_links, links_v1, links_v2),
+        'statistic': (make_logs, statistic_v1, statistic_v2),
+    }
+    results = {}
+    for name, (make_rows, old, new) in cases.items():
+        rows = make_rows(args.rows)
+        assert orjson.loads(old(rows[:10])) == orjson.loads(new(rows[:10]))
+
+        results[f'{name}_v1'] = measure(old, rows, args.repeat)
+        results[f'{name}_v2'] = measure(new, rows, args.repeat)
+
+    report.print_table(results)
+    for name in cases:
+        speedup = (
+            results[f'{name}_v2']['throughput_rps'] / results[f'{name}_v1']['throughput_rps']
+        )
+        print(f'{name}: x{speedup:.1f} faster')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5, help='at least 2')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main(parse_args())
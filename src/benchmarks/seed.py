@@ -0,0 +1,100 @@
+"""
+Benchmark dataset: users, short links and access logs with a Zipf-like click
+distribution (the link of rank r gets clicks proportional to 1 / r^s).
+Every row is marked with the `bench-` prefix, so the dataset is removed without
+touching the other data.
+"""
+from dataclasses import dataclass
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+PREFIX = 'bench-'
+
+
+@dataclass
+class Dataset:
+    users: int = 100
+    links: int = 10000
+    access_logs: int = 200000
+    zipf_exponent: float = 1.1
+
+
+def zipf_rank_sql(links: int, exponent: float) -> str:
+    """
+    Rank in [1, links] drawn by the inverse transform of the continuous power law
+    """
+    if exponent == 1:
+        return f'floor(exp(random() * ln({links} + 1)))::int'
+    power = 1 - exponent
+    return (
+        f'least(floor(power((power({links} + 1, {power}) - 1) * random() + 1, '
+        f'{1 / power}))::int, {links})'
+    )
+
+
+async def seed(engine: AsyncEngine, dataset: Dataset) -> List[str]:
+    """
+    Insert the dataset and get its short urls ordered by rank, the most clicked first
+    """
+    statements = (
+        f"""
+        INSERT INTO "user" (id, email, hashed_password, is_active, is_superuser, is_verified)
+        SELECT gen_random_uuid(), '{PREFIX}' || i || '@example.com', '', true, false, false
+        FROM generate_series(1, {dataset.users}) AS i
+        """,
+        f"""
+        INSERT INTO short_link (short_url, original_url, link_type, owner_id)
+        SELECT '{PREFIX}' || i, 'http://bench.example.com/' || i, 'public',
+               (SELECT id FROM "user"
+                WHERE email = '{PREFIX}' || (i % {dataset.users} + 1) || '@example.com')
+        FROM generate_series(1, {dataset.links}) AS i
+        """,
+        f"""
+        INSERT INTO access_log (short_link_id, client_ip, create_at)
+        SELECT short_link.id, '10.0.0.1', now() - random() * interval '30 days'
+        FROM (
+            SELECT {zipf_rank_sql(dataset.links, dataset.zipf_exponent)} AS rank
+            FROM generate_series(1, {dataset.access_logs})
+        ) AS clicks
+        JOIN short_link ON short_link.short_url = '{PREFIX}' || clicks.rank
+        """,
+        f"""
+        INSERT INTO link_click_total (short_link_id, requests_count)
+        SELECT short_link_id, count(*) FROM access_log
+        JOIN short_link ON short_link.id = access_log.short_link_id
+        WHERE short_link.short_url LIKE '{PREFIX}%'
+        GROUP BY short_link_id
+        """,
+        f"""
+        INSERT INTO link_click_hourly (short_link_id, bucket, requests_count)
+        SELECT short_link_id, date_trunc('hour', access_log.create_at), count(*) FROM access_log
+        JOIN short_link ON short_link.id = access_log.short_link_id
+        WHERE short_link.short_url LIKE '{PREFIX}%'
+        GROUP BY 1, 2
+        """,
+        'ANALYZE "user", short_link, access_log, link_click_total, link_click_hourly',
+    )
+
+    async with engine.begin() as connection:
+        for statement in statements:
+            await connection.execute(text(statement))
+
+    return [f'{PREFIX}{rank}' for rank in range(1, dataset.links + 1)]
+
+
+async def cleanup(engine: AsyncEngine) -> None:
+    links = f"SELECT id FROM short_link WHERE short_url LIKE '{PREFIX}%' " \
+            f"OR original_url LIKE 'http://bench.example.com/%'"
+    statements = (
+        f'DELETE FROM access_log WHERE short_link_id IN ({links})',
+        f'DELETE FROM link_click_hourly WHERE short_link_id IN ({links})',
+        f'DELETE FROM link_click_total WHERE short_link_id IN ({links})',
+        f'DELETE FROM short_link WHERE id IN ({links})',
+        f"DELETE FROM \"user\" WHERE email LIKE '{PREFIX}%'",
+    )
+
+    async with engine.begin() as connection:
+        for statement in statements:
+            await connection.execute(text(statement))
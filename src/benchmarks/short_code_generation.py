@@ -0,0 +1,39 @@
+"""
+Short codes generated per second by every generator.
+
+Run against a migrated database:
+    PYTHONPATH=src python -m benchmarks.short_code_generation
+"""
+import asyncio
+import time
+
+from db.db import engine
+from services.helpers import id_generator
+from services.short_code import build_short_code_generator
+
+CODES = 100000
+
+
+async def random_codes():
+    return id_generator()
+
+
+async def main():
+    generators = {
+        'random': random_codes,
+        'hilo': build_short_code_generator('hilo').generate,
+        'snowflake': build_short_code_generator('snowflake').generate,
+    }
+
+    print(f'{"generator":>10} {"codes/s":>12}')
+    for name, generate in generators.items():
+        started = time.perf_counter()
+        for _ in range(CODES):
+            await generate()
+        print(f'{name:>10} {CODES / (time.perf_counter() - started):>12.0f}')
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
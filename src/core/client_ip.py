@@ -0,0 +1,30 @@
+import ipaddress
+from typing import Mapping, Optional
+
+from fastapi import Request
+
+from core.config import app_settings
+
+
+def forwarded_client_ip(headers: Mapping[str, str]) -> Optional[str]:
+    """
+    The client address as seen by the proxy in front of the service: `X-Real-IP`,
+    else the last `X-Forwarded-For` entry, the one added by the proxy itself.
+    The earlier entries come from the client and can be forged.
+    """
+    candidate = headers.get('x-real-ip') or headers.get('x-forwarded-for', '').split(',')[-1]
+    try:
+        return str(ipaddress.ip_address(candidate.strip()))
+    except ValueError:
+        return None
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    The address of the client, from the forwarded headers if they are trusted
+    """
+    if app_settings.trust_forwarded_headers:
+        forwarded = forwarded_client_ip(request.headers)
+        if forwarded is not None:
+            return forwarded
+    return request.client.host if request.client else None
@@ -1,9 +1,10 @@
 import os
+from typing import Dict, List, Optional, Tuple
 from logging import config as logging_config
 
 from dotenv import load_dotenv
-from pydantic.env_settings import BaseSettings
-from pydantic.networks import PostgresDsn
+from pydantic import PostgresDsn
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from core.logger import LOGGING
 
@@ -14,16 +15,64 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class AppSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_file='.env', extra='ignore')
+
     app_title: str = "LibraryApp"
     project_name: str
     project_host: str
     project_port: int
+    # The base of the short URLs in the responses, e.g. https://sho.rt
+    # Without it the forwarded headers give the base, if they are trusted
+    public_base_url: Optional[str] = None
+    trust_forwarded_headers: bool = False
     database_dsn: PostgresDsn
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    # 0 disables the prepared statements cache, as needed behind pgbouncer in transaction mode
+    db_statement_cache_size: int = 100
+    database_replica_dsns: List[PostgresDsn] = []
+    replica_health_check_interval: float = 5
+    replica_read_your_writes_window: float = 0
     secret: str
     black_list: list
-
-    class Config:
-        env_file = '.env'
+    black_list_file: Optional[str] = None
+    black_list_from_db: bool = True
+    black_list_reload_interval: float = 30
+    link_cache_size: int = 10000
+    link_cache_ttl: int = 300
+    cache_backend: str = 'memory'
+    redis_dsn: Optional[str] = None
+    cache_invalidation_channel: str = 'short_link_invalidation'
+    principal_cache_size: int = 10000
+    principal_cache_ttl: float = 300
+    principal_invalidation_channel: str = 'principal_invalidation'
+    access_log_batch_size: int = 500
+    access_log_flush_interval: float = 1
+    access_log_queue_size: int = 10000
+    access_log_overflow_policy: str = 'drop'
+    access_log_extra_headers: list = ['accept-language']
+    access_log_partitions_ahead: int = 3
+    access_log_retention_months: Optional[int] = None
+    access_log_archive_dir: Optional[str] = None
+    access_log_maintenance_interval: int = 3600
+    short_code_generator: str = 'hilo'
+    short_code_min_length: int = 7
+    # Required by the snowflake generator, unique per process
+    short_code_worker_id: Optional[int] = None
+    short_link_batch_max_size: int = 1000
+    short_link_batch_chunk_size: int = 1000
+    user_links_page_max_size: int = 1000
+    rate_limit_backend: str = 'memory'
+    rate_limit_max_buckets: int = 100000
+    # route -> key kind (ip, client, link) -> (tokens per second, bucket capacity)
+    rate_limits: Dict[str, Dict[str, Tuple[float, int]]] = {
+        'create': {'client': (10, 100)},
+        'batch': {'client': (1, 10)},
+        'redirect': {'client': (50, 200), 'link': (1000, 2000)},
+    }
 
 
 app_settings = AppSettings()
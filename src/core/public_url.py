@@ -0,0 +1,30 @@
+from contextvars import ContextVar
+from typing import Mapping
+
+from core.config import app_settings
+
+
+def configured_base_url() -> str:
+    if app_settings.public_base_url:
+        return app_settings.public_base_url.rstrip('/')
+    return f'http://{app_settings.project_host}:{app_settings.project_port}'
+
+
+# The base of the short URLs in the responses, set per request
+# from the forwarded headers when they are trusted
+public_base_url: ContextVar[str] = ContextVar('public_base_url', default=configured_base_url())
+
+
+def forwarded_base_url(scheme: str, headers: Mapping[str, str]) -> str:
+    """
+    The base URL the client used to reach the proxy in front of the service
+    """
+    proto = headers.get('x-forwarded-proto', scheme).split(',')[0].strip()
+    host = headers.get('x-forwarded-host') or headers.get('host')
+    if not host:
+        return public_base_url.get()
+    return f'{proto}://{host.split(",")[0].strip()}'
+
+
+def short_url_of(code: str) -> str:
+    return f'{public_base_url.get()}/{code}'
@@ -1,18 +1,92 @@
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, AsyncIterator, Iterator
 
 from core.config import app_settings
+from fastapi import Request
+from pydantic import PostgresDsn
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import (create_async_engine, AsyncEngine, AsyncSession,
+                                    async_sessionmaker)
+
+from db.pool import InstrumentedAsyncPool
+from db.replicas import SessionRouter, read_your_writes_key
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(app_settings.database_dsn, future=True)
+def create_engine(dsn: PostgresDsn) -> AsyncEngine:
+    return create_async_engine(
+        str(dsn),
+        future=True,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=app_settings.db_pool_size,
+        max_overflow=app_settings.db_max_overflow,
+        pool_timeout=app_settings.db_pool_timeout,
+        pool_recycle=app_settings.db_pool_recycle,
+        pool_pre_ping=app_settings.db_pool_pre_ping,
+        connect_args={'statement_cache_size': app_settings.db_statement_cache_size},
+    )
+
+
+engine = create_engine(app_settings.database_dsn)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+session_router = SessionRouter(
+    primary=engine,
+    replicas=[create_engine(dsn) for dsn in app_settings.database_replica_dsns],
+    health_check_interval=app_settings.replica_health_check_interval,
+    read_your_writes_window=app_settings.replica_read_your_writes_window,
+)
+
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+@contextmanager
+def replica_failures(read_engine: AsyncEngine) -> Iterator[None]:
+    """
+    Take the replica out of the rotation when its connection is lost
+    """
+    try:
+        yield
+    except OSError:
+        session_router.mark_failed(read_engine)
+        raise
+    except DBAPIError as e:
+        if e.connection_invalidated:
+            session_router.mark_failed(read_engine)
+        raise
+
+
+@asynccontextmanager
+async def read_session(request: Request) -> AsyncIterator[AsyncSession]:
+    """
+    Session for the read-only queries, on a replica if there is a healthy one
+    """
+    read_engine = session_router.read_engine(read_your_writes_key(request))
+
+    async with async_session_maker(bind=read_engine) as session:
+        with replica_failures(read_engine):
+            yield session
+
+
+async def get_async_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for the read-only endpoints. Closed before the response is sent,
+    so the streamed responses open their own `read_session`
+    """
+    async with read_session(request) as session:
+        yield session
+
+
+async def track_writes(request: Request) -> None:
+    """
+    Send the client's reads to the primary for a while after its write. The window starts
+    before the write, so it is open by the time the client has the response.
+    """
+    session_router.mark_write(read_your_writes_key(request))
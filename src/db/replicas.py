@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.client_ip import client_ip
+
+logger = logging.getLogger()
+
+
+def read_your_writes_key(request: Request) -> Optional[str]:
+    """
+    The client identity of the read-your-writes window: its access token
+    or, for the anonymous clients, its address
+    """
+    authorization = request.headers.get('authorization')
+    if authorization:
+        return authorization
+    return client_ip(request)
+
+
+class SessionRouter:
+    """
+    Chooses the engine of the read-only sessions: the healthy replicas in turn
+    or the primary when there are none.
+
+    The replicas are checked with `SELECT 1` every `health_check_interval` seconds and
+    the failed ones are taken out of the rotation until they answer again.
+    For `read_your_writes_window` seconds after a client's write its reads go
+    to the primary, so the client does not miss its changes on a lagging replica.
+    """
+
+    def __init__(
+            self,
+            primary: AsyncEngine,
+            replicas: Sequence[AsyncEngine] = (),
+            health_check_interval: float = 5,
+            health_check_timeout: float = 1,
+            read_your_writes_window: float = 0,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._health_check_interval = health_check_interval
+        self._health_check_timeout = health_check_timeout
+        self._read_your_writes_window = read_your_writes_window
+
+        self._healthy: List[AsyncEngine] = list(self.replicas)
+        self._turn = itertools.count()
+        self._recent_writers: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def read_engine(self, key: Optional[str] = None) -> AsyncEngine:
+        if key is not None and self._recent_writers.get(key, 0) > time.monotonic():
+            return self.primary
+
+        healthy = self._healthy
+        if not healthy:
+            return self.primary
+        return healthy[next(self._turn) % len(healthy)]
+
+    def mark_write(self, key: Optional[str]) -> None:
+        if key is None or self._read_your_writes_window <= 0:
+            return
+
+        now = time.monotonic()
+        if len(self._recent_writers) >= 10000:
+            self._recent_writers = {
+                writer: expire_at for writer, expire_at in self._recent_writers.items()
+                if expire_at > now
+            }
+        self._recent_writers[key] = now + self._read_your_writes_window
+
+    def mark_failed(self, engine: AsyncEngine) -> None:
+        if engine in self._healthy:
+            self._healthy = [replica for replica in self._healthy if replica is not engine]
+            logger.warning(f'Replica {engine.url.host}:{engine.url.port} is out of rotation')
+
+    async def _is_alive(self, engine: AsyncEngine) -> bool:
+        try:
+            async with engine.connect() as connection:
+                await asyncio.wait_for(
+                    connection.execute(text('SELECT 1')), self._health_check_timeout
+                )
+            return True
+        except Exception as e:
+            logger.warning(f'Replica {engine.url.host}:{engine.url.port} health check failed: {e}')
+            return False
+
+    async def check_health(self) -> None:
+        alive = await asyncio.gather(*(self._is_alive(replica) for replica in self.replicas))
+        healthy = [replica for replica, is_alive in zip(self.replicas, alive) if is_alive]
+
+        for replica in healthy:
+            if replica not in self._healthy:
+                logger.info(f'Replica {replica.url.host}:{replica.url.port} is back in rotation')
+        self._healthy = healthy
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._health_check_interval)
+            await self.check_health()
+
+    def start(self) -> None:
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'replicas': len(self.replicas),
+            'healthy': [f'{replica.url.host}:{replica.url.port}' for replica in self._healthy],
+            'recent_writers': len(self._recent_writers),
+        }
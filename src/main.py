@@ -1,10 +1,24 @@
+import asyncio
+import time
+
 import uvicorn
 from fastapi import FastAPI, status, Response
 from fastapi.responses import ORJSONResponse
 
+from api.metrics import metrics_router
 from api.shorten_url import shorten_url_router
+from core.client_ip import client_ip
 from core.config import app_settings
+from core.public_url import forwarded_base_url, public_base_url
 from api.v1 import base
+from db.db import engine, session_router
+from services.access_log_writer import access_log_writer
+from services.blacklist import ip_blacklist
+from services.metrics import (RequestDBUsage, ServiceCollector, instrument_engine,
+                              observe_request, registry, request_db_usage)
+from services.partitions import partition_manager
+from services.principal import principal_cache
+from services.shortlink import link_cache
 
 app = FastAPI(
     title=app_settings.app_title,
@@ -13,18 +27,68 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
 )
 
+for db_engine in (engine, *session_router.replicas):
+    instrument_engine(db_engine)
+registry.register(ServiceCollector(link_cache, access_log_writer, engine))
+
+
+@app.on_event('startup')
+async def startup():
+    await link_cache.start()
+    await principal_cache.start()
+    session_router.start()
+    ip_blacklist.start()
+    access_log_writer.start()
+    app.state.partition_maintenance = asyncio.create_task(
+        partition_manager.run(app_settings.access_log_maintenance_interval)
+    )
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    app.state.partition_maintenance.cancel()
+    try:
+        await app.state.partition_maintenance
+    except asyncio.CancelledError:
+        pass
+    await access_log_writer.stop()
+    await ip_blacklist.stop()
+    await session_router.stop()
+    await principal_cache.stop()
+    await link_cache.stop()
+
 
 @app.middleware("http")
 async def check_client_ip(request, call_next):
-    host = request.client.host
-
-    if host in app_settings.black_list:
+    if ip_blacklist.match(client_ip(request)) is not None:
         return Response(status_code=status.HTTP_403_FORBIDDEN, content='Access denied')
 
     return await call_next(request)
 
 
+if app_settings.public_base_url is None and app_settings.trust_forwarded_headers:
+    @app.middleware("http")
+    async def set_public_base_url(request, call_next):
+        public_base_url.set(forwarded_base_url(request.url.scheme, request.headers))
+        return await call_next(request)
+
+
+@app.middleware("http")
+async def collect_metrics(request, call_next):
+    request_db_usage.set(RequestDBUsage())
+    started = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        observe_request(request, status_code, time.perf_counter() - started)
+
+
 app.include_router(base.api_router, prefix='/api/v1')
+app.include_router(metrics_router, prefix='', tags=['main', ])
 app.include_router(shorten_url_router, prefix='', tags=['main', ])
 
 if __name__ == '__main__':
@@ -0,0 +1,49 @@
+"""07_add_click_rollups
+
+Revision ID: 7c1f3b9e2a4d
+Revises: 2d94b2cb61b4
+Create Date: 2026-10-18 19:45:12.318201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1f3b9e2a4d'
+down_revision = '2d94b2cb61b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('link_click_total',
+    sa.Column('short_link_id', sa.Integer(), nullable=False),
+    sa.Column('requests_count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['short_link_id'], ['short_link.id'], ),
+    sa.PrimaryKeyConstraint('short_link_id')
+    )
+    op.create_table('link_click_hourly',
+    sa.Column('short_link_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('requests_count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['short_link_id'], ['short_link.id'], ),
+    sa.PrimaryKeyConstraint('short_link_id', 'bucket')
+    )
+
+    # The writers are blocked until the backfill is committed, so no click is counted twice or lost
+    op.execute('LOCK TABLE access_log IN SHARE MODE')
+    op.execute(
+        'INSERT INTO link_click_total (short_link_id, requests_count) '
+        'SELECT short_link_id, count(*) FROM access_log GROUP BY short_link_id'
+    )
+    op.execute(
+        'INSERT INTO link_click_hourly (short_link_id, bucket, requests_count) '
+        "SELECT short_link_id, date_trunc('hour', create_at), count(*) FROM access_log "
+        "GROUP BY short_link_id, date_trunc('hour', create_at)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('link_click_hourly')
+    op.drop_table('link_click_total')
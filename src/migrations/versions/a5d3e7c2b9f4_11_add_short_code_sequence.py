@@ -0,0 +1,26 @@
+"""11_add_short_code_sequence
+
+Revision ID: a5d3e7c2b9f4
+Revises: f2a7c9e1d3b6
+Create Date: 2026-10-18 22:04:37.502118
+
+The generated codes are at least 7 characters long,
+so they never collide with the 6-letter random codes made before.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d3e7c2b9f4'
+down_revision = 'f2a7c9e1d3b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_seq', increment=1000)))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_code_seq')))
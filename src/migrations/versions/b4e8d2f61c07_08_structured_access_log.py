@@ -0,0 +1,141 @@
+"""08_structured_access_log
+
+Revision ID: b4e8d2f61c07
+Revises: 7c1f3b9e2a4d
+Create Date: 2026-10-18 20:05:41.902114
+
+The free text `connection_info` (a stringified dict of the request headers) is parsed
+into the typed columns. The headers without their own column are kept in `extras`,
+so the conversion loses nothing.
+"""
+import ast
+import ipaddress
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8d2f61c07'
+down_revision = '7c1f3b9e2a4d'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def parse_client_ip(headers: dict):
+    forwarded = headers.pop('x-forwarded-for', None)
+    real_ip = headers.pop('x-real-ip', None)
+    candidate = (forwarded or '').split(',')[0].strip() or real_ip
+    try:
+        return str(ipaddress.ip_address(candidate))
+    except ValueError:
+        return None
+
+
+def get_dictionary_id(connection, table: str, value, max_length: int, ids: dict):
+    if not value:
+        return None
+
+    value = value[:max_length]
+    if value not in ids:
+        connection.execute(
+            sa.text(f'INSERT INTO {table} (value) VALUES (:value) ON CONFLICT DO NOTHING'),
+            {'value': value}
+        )
+        ids[value] = connection.execute(
+            sa.text(f'SELECT id FROM {table} WHERE value = :value'), {'value': value}
+        ).scalar_one()
+    return ids[value]
+
+
+def convert_connection_info(connection) -> None:
+    user_agent_ids, referer_ids = {}, {}
+    update = sa.text(
+        'UPDATE access_log SET client_ip = CAST(:client_ip AS INET), '
+        'user_agent_id = :user_agent_id, referer_id = :referer_id, extras = :extras '
+        'WHERE id = :id'
+    ).bindparams(sa.bindparam('extras', type_=postgresql.JSONB(none_as_null=True)))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                'SELECT id, connection_info FROM access_log '
+                'WHERE id > :last_id ORDER BY id LIMIT :limit'
+            ),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+
+        values = []
+        for row_id, connection_info in rows:
+            try:
+                headers = ast.literal_eval(connection_info or '{}')
+            except (ValueError, SyntaxError):
+                headers = {'connection_info': connection_info}
+
+            values.append({
+                'id': row_id,
+                'client_ip': parse_client_ip(headers),
+                'user_agent_id': get_dictionary_id(
+                    connection, 'user_agent', headers.pop('user-agent', None), 512,
+                    user_agent_ids
+                ),
+                'referer_id': get_dictionary_id(
+                    connection, 'referer', headers.pop('referer', None), 1024, referer_ids
+                ),
+                'extras': headers or None,
+            })
+
+        connection.execute(update, values)
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.create_table('user_agent',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.String(length=512), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('value')
+    )
+    op.create_table('referer',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.String(length=1024), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('value')
+    )
+    op.add_column('access_log', sa.Column('client_ip', postgresql.INET(), nullable=True))
+    op.add_column('access_log', sa.Column('user_agent_id', sa.Integer(), nullable=True))
+    op.add_column('access_log', sa.Column('referer_id', sa.Integer(), nullable=True))
+    op.add_column('access_log', sa.Column('extras', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.create_foreign_key(None, 'access_log', 'user_agent', ['user_agent_id'], ['id'])
+    op.create_foreign_key(None, 'access_log', 'referer', ['referer_id'], ['id'])
+
+    convert_connection_info(op.get_bind())
+
+    op.drop_column('access_log', 'connection_info')
+
+
+def downgrade() -> None:
+    op.add_column('access_log', sa.Column('connection_info', sa.TEXT(), autoincrement=False, nullable=True))
+    op.execute(
+        'UPDATE access_log SET connection_info = ('
+        "jsonb_strip_nulls(jsonb_build_object("
+        "'x-real-ip', host(client_ip), "
+        "'user-agent', (SELECT value FROM user_agent WHERE user_agent.id = user_agent_id), "
+        "'referer', (SELECT value FROM referer WHERE referer.id = referer_id)"
+        ")) || coalesce(extras, '{}'::jsonb)"
+        ')::text'
+    )
+    op.drop_constraint('access_log_referer_id_fkey', 'access_log', type_='foreignkey')
+    op.drop_constraint('access_log_user_agent_id_fkey', 'access_log', type_='foreignkey')
+    op.drop_column('access_log', 'extras')
+    op.drop_column('access_log', 'referer_id')
+    op.drop_column('access_log', 'user_agent_id')
+    op.drop_column('access_log', 'client_ip')
+    op.drop_table('referer')
+    op.drop_table('user_agent')
@@ -0,0 +1,140 @@
+"""12_add_short_link_url_hash
+
+Revision ID: c8f1b6d4e2a7
+Revises: a5d3e7c2b9f4
+Create Date: 2026-10-19 10:12:53.640871
+
+The hash is backfilled on the oldest active link of every owner, type and URL.
+The newer duplicates keep working without the hash, unless they are merged with
+    alembic -c src/alembic.ini -x merge_duplicates=true upgrade head
+which moves their access logs and click counts to the oldest link and deactivates them,
+so their short urls answer 410 Gone.
+"""
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1b6d4e2a7'
+down_revision = 'a5d3e7c2b9f4'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    # services.helpers.normalize_url as of this revision
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+
+    if ':' in netloc:
+        netloc = f'[{netloc}]'
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{parts.port}'
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo = f'{userinfo}:{parts.password}'
+        netloc = f'{userinfo}@{netloc}'
+
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def backfill_url_hash(connection) -> list:
+    """
+    Set the hash on the oldest active link of every owner, type and URL,
+    return the (duplicate_id, canonical_id) pairs of the others
+    """
+    canonical_ids, duplicates = {}, []
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                'SELECT id, owner_id, link_type, original_url FROM short_link '
+                'WHERE is_active AND id > :last_id ORDER BY id LIMIT :limit'
+            ),
+            {'last_id': last_id, 'limit': BATCH_SIZE}
+        ).all()
+        if not rows:
+            break
+
+        values = []
+        for row_id, owner_id, link_type, original_url in rows:
+            url_hash = hashlib.sha256(normalize_url(original_url).encode()).digest()
+            key = (owner_id, link_type, url_hash)
+            if key in canonical_ids:
+                duplicates.append({'duplicate_id': row_id, 'canonical_id': canonical_ids[key]})
+            else:
+                canonical_ids[key] = row_id
+                values.append({'id': row_id, 'url_hash': url_hash})
+
+        if values:
+            connection.execute(
+                sa.text('UPDATE short_link SET url_hash = :url_hash WHERE id = :id'), values
+            )
+        last_id = rows[-1][0]
+
+    return duplicates
+
+
+def merge_duplicates(connection, duplicates: list) -> None:
+    connection.execute(sa.text(
+        'CREATE TEMPORARY TABLE short_link_merge '
+        '(duplicate_id INTEGER PRIMARY KEY, canonical_id INTEGER NOT NULL) ON COMMIT DROP'
+    ))
+    connection.execute(
+        sa.text('INSERT INTO short_link_merge VALUES (:duplicate_id, :canonical_id)'), duplicates
+    )
+    connection.execute(sa.text(
+        'UPDATE access_log SET short_link_id = m.canonical_id FROM short_link_merge m '
+        'WHERE access_log.short_link_id = m.duplicate_id'
+    ))
+    connection.execute(sa.text(
+        'INSERT INTO link_click_total (short_link_id, requests_count) '
+        'SELECT m.canonical_id, sum(t.requests_count) FROM link_click_total t '
+        'JOIN short_link_merge m ON t.short_link_id = m.duplicate_id GROUP BY m.canonical_id '
+        'ON CONFLICT (short_link_id) DO UPDATE '
+        'SET requests_count = link_click_total.requests_count + excluded.requests_count'
+    ))
+    connection.execute(sa.text(
+        'INSERT INTO link_click_hourly (short_link_id, bucket, requests_count) '
+        'SELECT m.canonical_id, h.bucket, sum(h.requests_count) FROM link_click_hourly h '
+        'JOIN short_link_merge m ON h.short_link_id = m.duplicate_id '
+        'GROUP BY m.canonical_id, h.bucket '
+        'ON CONFLICT (short_link_id, bucket) DO UPDATE '
+        'SET requests_count = link_click_hourly.requests_count + excluded.requests_count'
+    ))
+    for table in ('link_click_total', 'link_click_hourly'):
+        connection.execute(sa.text(
+            f'DELETE FROM {table} USING short_link_merge m '
+            f'WHERE {table}.short_link_id = m.duplicate_id'
+        ))
+    connection.execute(sa.text(
+        'UPDATE short_link SET is_active = false FROM short_link_merge m '
+        'WHERE short_link.id = m.duplicate_id'
+    ))
+
+
+def upgrade() -> None:
+    op.add_column('short_link', sa.Column('url_hash', sa.LargeBinary(length=32), nullable=True))
+
+    connection = op.get_bind()
+    duplicates = backfill_url_hash(connection)
+    if duplicates and context.get_x_argument(as_dictionary=True).get('merge_duplicates') == 'true':
+        merge_duplicates(connection, duplicates)
+
+    op.create_index('ix_short_link_anonymous_url_hash', 'short_link', ['link_type', 'url_hash'], unique=True, postgresql_where=sa.text('is_active AND url_hash IS NOT NULL AND owner_id IS NULL'))
+    op.create_index('ix_short_link_owner_id_url_hash', 'short_link', ['owner_id', 'link_type', 'url_hash'], unique=True, postgresql_where=sa.text('is_active AND url_hash IS NOT NULL AND owner_id IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_short_link_owner_id_url_hash', table_name='short_link', postgresql_where=sa.text('is_active AND url_hash IS NOT NULL AND owner_id IS NOT NULL'))
+    op.drop_index('ix_short_link_anonymous_url_hash', table_name='short_link', postgresql_where=sa.text('is_active AND url_hash IS NOT NULL AND owner_id IS NULL'))
+    op.drop_column('short_link', 'url_hash')
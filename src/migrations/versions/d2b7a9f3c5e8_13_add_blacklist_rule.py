@@ -0,0 +1,32 @@
+"""13_add_blacklist_rule
+
+Revision ID: d2b7a9f3c5e8
+Revises: c8f1b6d4e2a7
+Create Date: 2026-10-19 12:41:27.093315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b7a9f3c5e8'
+down_revision = 'c8f1b6d4e2a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('blacklist_rule',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('network', postgresql.CIDR(), nullable=False),
+    sa.Column('comment', sa.String(length=1024), nullable=True),
+    sa.Column('create_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('network')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('blacklist_rule')
@@ -0,0 +1,33 @@
+"""09_add_hot_query_indexes
+
+Revision ID: e93a6c4d8b15
+Revises: b4e8d2f61c07
+Create Date: 2026-10-18 20:31:09.114760
+
+The indexes are built concurrently, so the big tables stay writable during the migration.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a6c4d8b15'
+down_revision = 'b4e8d2f61c07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_short_link_owner_id_id_active', 'short_link', ['owner_id', 'id'], unique=False, postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.create_index('ix_access_log_short_link_id_id', 'access_log', ['short_link_id', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_access_log_short_link_id_create_at', 'access_log', ['short_link_id', 'create_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_access_log_create_at', 'access_log', ['create_at'], unique=False, postgresql_using='brin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_access_log_create_at', table_name='access_log', postgresql_concurrently=True)
+        op.drop_index('ix_access_log_short_link_id_create_at', table_name='access_log', postgresql_concurrently=True)
+        op.drop_index('ix_access_log_short_link_id_id', table_name='access_log', postgresql_concurrently=True)
+        op.drop_index('ix_short_link_owner_id_id_active', table_name='short_link', postgresql_concurrently=True)
@@ -0,0 +1,94 @@
+"""10_partition_access_log
+
+Revision ID: f2a7c9e1d3b6
+Revises: e93a6c4d8b15
+Create Date: 2026-10-18 21:02:33.570219
+
+`access_log` is rebuilt as a table partitioned by month of `create_at`.
+The partitions cover the existing rows and the next months, the rows out of them
+go to the default partition. The later partitions are created by services.partitions.
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9e1d3b6'
+down_revision = 'e93a6c4d8b15'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+COLUMNS = 'id, short_link_id, client_ip, user_agent_id, referer_id, extras, create_at'
+
+
+def month_start(day: date, months: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def create_table(name: str, partitioned: bool) -> None:
+    op.execute(
+        f'CREATE TABLE {name} ('
+        "id INTEGER NOT NULL DEFAULT nextval('access_log_id_seq'), "
+        'short_link_id INTEGER NOT NULL REFERENCES short_link (id), '
+        'client_ip INET, '
+        'user_agent_id INTEGER REFERENCES user_agent (id), '
+        'referer_id INTEGER REFERENCES referer (id), '
+        'extras JSONB, '
+        'create_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(), '
+        + ('PRIMARY KEY (id, create_at)) PARTITION BY RANGE (create_at)' if partitioned
+           else 'PRIMARY KEY (id))')
+    )
+
+
+def replace_table(name: str) -> None:
+    op.execute('ALTER SEQUENCE access_log_id_seq OWNED BY NONE')
+    op.execute('DROP TABLE access_log')
+    op.execute(f'ALTER TABLE {name} RENAME TO access_log')
+    op.execute(f'ALTER TABLE access_log RENAME CONSTRAINT {name}_pkey TO access_log_pkey')
+    for column in ('short_link_id', 'user_agent_id', 'referer_id'):
+        op.execute(
+            f'ALTER TABLE access_log RENAME CONSTRAINT {name}_{column}_fkey '
+            f'TO access_log_{column}_fkey'
+        )
+    op.execute('ALTER SEQUENCE access_log_id_seq OWNED BY access_log.id')
+
+    op.create_index('ix_access_log_short_link_id_id', 'access_log', ['short_link_id', 'id'], unique=False)
+    op.create_index('ix_access_log_short_link_id_create_at', 'access_log', ['short_link_id', 'create_at'], unique=False)
+    op.create_index('ix_access_log_create_at', 'access_log', ['create_at'], unique=False, postgresql_using='brin')
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    # The reads go on, the writes wait for the end of the migration
+    op.execute('LOCK TABLE access_log IN EXCLUSIVE MODE')
+
+    create_table('access_log_partitioned', partitioned=True)
+
+    oldest = connection.execute(sa.text('SELECT min(create_at) FROM access_log')).scalar()
+    current = month_start(date.today())
+    month = month_start(oldest.date()) if oldest else current
+    while month <= month_start(current, MONTHS_AHEAD):
+        op.execute(
+            f'CREATE TABLE access_log_p{month:%Y%m} PARTITION OF access_log_partitioned '
+            f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')"
+        )
+        month = month_start(month, 1)
+    op.execute('CREATE TABLE access_log_default PARTITION OF access_log_partitioned DEFAULT')
+
+    op.execute(
+        f'INSERT INTO access_log_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM access_log'
+    )
+    replace_table('access_log_partitioned')
+
+
+def downgrade() -> None:
+    op.execute('LOCK TABLE access_log IN EXCLUSIVE MODE')
+
+    create_table('access_log_plain', partitioned=False)
+    op.execute(f'INSERT INTO access_log_plain ({COLUMNS}) SELECT {COLUMNS} FROM access_log')
+    replace_table('access_log_plain')
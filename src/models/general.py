@@ -1,6 +1,8 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
-from sqlalchemy import String, Text, ForeignKey, func
+import orjson
+from sqlalchemy import BigInteger, Index, LargeBinary, Sequence, String, ForeignKey, func, text
+from sqlalchemy.dialects.postgresql import CIDR, INET, JSONB
 from fastapi_users_db_sqlalchemy.generics import GUID
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,29 +16,110 @@ from db.db import Base, get_async_session
 
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
-    links = relationship("ShortLink", back_populates="owner", lazy=False)
+    links = relationship("ShortLink", back_populates="owner", lazy='raise')
 
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     yield SQLAlchemyUserDatabase(session, User)
 
 
+# Source of the short codes, leased in blocks of `increment` numbers by services.short_code
+short_code_sequence = Sequence('short_code_seq', increment=1000, metadata=Base.metadata)
+
+
 class ShortLink(Base):
     __tablename__ = 'short_link'
+    __table_args__ = (
+        Index(
+            'ix_short_link_owner_id_id_active', 'owner_id', 'id',
+            postgresql_where=text('is_active')
+        ),
+        # One active link per owner, type and URL among the deduplicated ones.
+        # Anonymous links have no owner_id and NULLs are distinct in the unique indexes
+        Index(
+            'ix_short_link_owner_id_url_hash', 'owner_id', 'link_type', 'url_hash', unique=True,
+            postgresql_where=text('is_active AND url_hash IS NOT NULL AND owner_id IS NOT NULL')
+        ),
+        Index(
+            'ix_short_link_anonymous_url_hash', 'link_type', 'url_hash', unique=True,
+            postgresql_where=text('is_active AND url_hash IS NOT NULL AND owner_id IS NULL')
+        ),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     short_url: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
     original_url: Mapped[str] = mapped_column(String(4096), nullable=False)
+    # SHA-256 of the normalized URL, set only on the links created with deduplication
+    url_hash: Mapped[Optional[bytes]] = mapped_column(LargeBinary(32))
     link_type: Mapped[str] = mapped_column(String(100), server_default='public', nullable=False)
     owner_id: Mapped[Optional[GUID]] = mapped_column(ForeignKey('user.id'))
-    owner: Mapped[Optional[User]] = relationship(User, back_populates='links', lazy=False)
+    owner: Mapped[Optional[User]] = relationship(User, back_populates='links', lazy='raise')
     is_active: Mapped[Optional[bool]] = mapped_column(server_default='True')
     create_at: Mapped[datetime] = mapped_column(server_default=func.now())
-    connections: Mapped[List["AccessLog"]] = relationship(lazy=False)
+    connections: Mapped[List["AccessLog"]] = relationship(lazy='raise')
+
+
+class UserAgent(Base):
+    __tablename__ = 'user_agent'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(512), unique=True)
+
+
+class Referer(Base):
+    __tablename__ = 'referer'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(String(1024), unique=True)
 
 
 class AccessLog(Base):
     __tablename__ = 'access_log'
-    id: Mapped[int] = mapped_column(primary_key=True)
+    __table_args__ = (
+        Index('ix_access_log_short_link_id_id', 'short_link_id', 'id'),
+        Index('ix_access_log_short_link_id_create_at', 'short_link_id', 'create_at'),
+        Index('ix_access_log_create_at', 'create_at', postgresql_using='brin'),
+        # The monthly partitions are managed by services.partitions
+        {'postgresql_partition_by': 'RANGE (create_at)'},
+    )
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     short_link_id: Mapped[int] = mapped_column(ForeignKey('short_link.id'))
-    connection_info: Mapped[Optional[str]] = mapped_column(Text())
+    client_ip: Mapped[Optional[str]] = mapped_column(INET)
+    user_agent_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user_agent.id'))
+    user_agent: Mapped[Optional[UserAgent]] = relationship(lazy='raise')
+    referer_id: Mapped[Optional[int]] = mapped_column(ForeignKey('referer.id'))
+    referer: Mapped[Optional[Referer]] = relationship(lazy='raise')
+    extras: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB(none_as_null=True))
+    create_at: Mapped[datetime] = mapped_column(primary_key=True, server_default=func.now())
+
+    @property
+    def connection_info(self) -> str:
+        """
+        Client information in the former free text format. Needs `user_agent`
+        and `referer` to be loaded.
+        """
+        info = {'client-ip': str(self.client_ip) if self.client_ip else None}
+        if self.user_agent is not None:
+            info['user-agent'] = self.user_agent.value
+        if self.referer is not None:
+            info['referer'] = self.referer.value
+        info.update(self.extras or {})
+        return orjson.dumps(info).decode()
+
+
+class LinkClickTotal(Base):
+    __tablename__ = 'link_click_total'
+    short_link_id: Mapped[int] = mapped_column(ForeignKey('short_link.id'), primary_key=True)
+    requests_count: Mapped[int] = mapped_column(BigInteger, server_default='0')
+
+
+class LinkClickHourly(Base):
+    __tablename__ = 'link_click_hourly'
+    short_link_id: Mapped[int] = mapped_column(ForeignKey('short_link.id'), primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(primary_key=True)
+    requests_count: Mapped[int] = mapped_column(BigInteger, server_default='0')
+
+
+class BlacklistRule(Base):
+    __tablename__ = 'blacklist_rule'
+    id: Mapped[int] = mapped_column(primary_key=True)
+    network: Mapped[str] = mapped_column(CIDR, unique=True)
+    comment: Mapped[Optional[str]] = mapped_column(String(1024))
     create_at: Mapped[datetime] = mapped_column(server_default=func.now())
@@ -1,17 +1,16 @@
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class AccessLogBase(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     connection_info: str
     create_at: datetime
 
-    class Config:
-        orm_mode = True
-
 
 class AccessLogCreate(AccessLogBase):
     ...
@@ -22,10 +21,21 @@ class AccessLogUpdate(AccessLogBase):
 
 
 class AccessLogToDBBase(BaseModel):
-    connection_info: str
     short_link_id: int
+    client_ip: Optional[str] = None
+    user_agent: Optional[str] = None
+    referer: Optional[str] = None
+    extras: Optional[Dict[str, str]] = None
 
 
 class AccessLogStatistic(BaseModel):
     requests_count: int = 0
     logs: Optional[List[AccessLogBase]] = None
+    next_cursor: Optional[int] = None
+
+
+class AccessLogHourly(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    bucket: datetime
+    requests_count: int
@@ -1,9 +1,25 @@
 from enum import Enum
 from uuid import UUID
-from typing import Optional, Dict, Literal
-from pydantic import BaseModel, Field, root_validator, AnyUrl
+from typing import Annotated, Any, Dict, Iterable, List, Literal, Optional, Sequence
+from pydantic import (AfterValidator, AnyUrl, BaseModel, ConfigDict, Field, TypeAdapter,
+                      field_validator)
 
-from core.config import app_settings
+from core.public_url import public_base_url, short_url_of
+
+_any_url = TypeAdapter(AnyUrl)
+
+
+def validate_url(url: str) -> str:
+    # The URL is checked, but kept as it was given: pydantic v2 would normalize it,
+    # e.g. add `/` to the empty path, and change the stored and returned URLs
+    _any_url.validate_python(url)
+    return url
+
+
+Url = Annotated[str, AfterValidator(validate_url)]
+
+# The length of the short_link.original_url column
+URL_MAX_LENGTH = 4096
 
 
 class LinkType(Enum):
@@ -16,15 +32,14 @@ class LinkType(Enum):
 
 
 class ShortLinkBase(BaseModel):
-    original_url: AnyUrl = Field(alias='original-url')
+    model_config = ConfigDict(populate_by_name=True)
+
+    original_url: Url = Field(alias='original-url', max_length=URL_MAX_LENGTH)
     link_type: Literal[
         LinkType.PUBLIC.value,
         LinkType.PRIVATE.value
     ] = LinkType.PUBLIC.value
 
-    class Config:
-        allow_population_by_field_name = True
-
 
 class ShortLinkCreate(ShortLinkBase):
     ...
@@ -39,27 +54,23 @@ class ShortLinkUpdate(BaseModel):
 
 class ShortLinkToDBBase(ShortLinkBase):
     short_url: str
-    original_url: AnyUrl
+    original_url: Url
     link_type: Optional[str] = LinkType.PUBLIC.value
-    owner_id: Optional[UUID]
-    is_active: Optional[bool]
+    owner_id: Optional[UUID] = None
+    is_active: Optional[bool] = None
+    url_hash: Optional[bytes] = None
 
 
 class ShortLinkInDBBase(BaseModel):
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
     id: int = Field(alias='short-id')
     short_url: str = Field(alias='short-url')
 
-    @root_validator
-    def compute_area(cls, values) -> Dict:
-        short_url = values.get('short_url')
-        values['short_url'] = (
-            f'http://{app_settings.project_host}:{app_settings.project_port}/{short_url}'
-        )
-        return values
-
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
+    @field_validator('short_url')
+    @classmethod
+    def compute_area(cls, short_url: str) -> str:
+        return short_url_of(short_url)
 
 
 class ShortLinkSchemaCreate(ShortLinkInDBBase):
@@ -67,9 +78,54 @@ class ShortLinkSchemaCreate(ShortLinkInDBBase):
 
 
 class ShortLinkSchemaList(ShortLinkInDBBase):
-    original_url: AnyUrl = Field(alias='original-url')
+    # Read from the database, where only the valid URLs get
+    original_url: str = Field(alias='original-url')
     link_type: str = Field(alias='type')
 
 
+class ShortLinkSchemaStatus(ShortLinkSchemaList):
+    clicks: Optional[int] = None
+
+
+def short_link_status_items(rows: Iterable[Sequence[Any]], with_clicks: bool) -> List[Dict]:
+    """
+    The dicts of ShortLinkSchemaStatus built straight from the
+    (id, short_url, original_url, link_type[, clicks]) rows, for the long lists
+    that are too slow to validate row by row
+    """
+    prefix = f'{public_base_url.get()}/'
+
+    if with_clicks:
+        return [
+            {
+                'short-id': id, 'short-url': prefix + short_url,
+                'original-url': original_url, 'type': link_type, 'clicks': clicks,
+            }
+            for id, short_url, original_url, link_type, clicks in rows
+        ]
+
+    return [
+        {
+            'short-id': id, 'short-url': prefix + short_url,
+            'original-url': original_url, 'type': link_type,
+        }
+        for id, short_url, original_url, link_type in rows
+    ]
+
+
 class ShortLinkInDB(ShortLinkInDBBase):
     pass
+
+
+class ShortLinkBatchResult(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    original_url: Optional[str] = Field(None, alias='original-url')
+    id: Optional[int] = Field(None, alias='short-id')
+    short_url: Optional[str] = Field(None, alias='short-url')
+    error: Optional[str] = None
+
+    @field_validator('short_url')
+    @classmethod
+    def compute_short_url(cls, short_url: Optional[str]) -> Optional[str]:
+        return short_url_of(short_url) if short_url is not None else None
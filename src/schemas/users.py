@@ -9,3 +9,7 @@ class UserRead(schemas.BaseUser[uuid.UUID]):
 
 class UserCreate(schemas.BaseUserCreate):
     pass
+
+
+class UserUpdate(schemas.BaseUserUpdate):
+    pass
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from core.config import app_settings
+from db.db import async_session_maker
+from schemas.access_log import AccessLogToDBBase
+from services.shortlink import access_log_crud
+
+logger = logging.getLogger()
+
+
+class AccessLogWriter:
+    """
+    Buffers the access logs in a bounded in-process queue and writes them
+    with one multi-row INSERT per batch. A batch is flushed when it reaches `batch_size`
+    or `flush_interval` seconds after its first log.
+
+    When the queue is full the new logs are dropped (`drop` policy)
+    or the redirect waits for a free slot (`block` policy).
+    """
+
+    def __init__(
+            self,
+            session_maker: async_sessionmaker[AsyncSession],
+            batch_size: int,
+            flush_interval: float,
+            max_queue_size: int,
+            overflow_policy: str = 'drop',
+    ):
+        self._session_maker = session_maker
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_queue_size = max_queue_size
+        self._overflow_policy = overflow_policy
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Write all the queued logs and stop the writer
+        """
+        if self._task is None:
+            return
+
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, access_log: AccessLogToDBBase) -> None:
+        self.start()
+
+        if self._overflow_policy == 'block':
+            await self._queue.put(access_log)
+            return
+
+        try:
+            self._queue.put_nowait(access_log)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def join(self) -> None:
+        """
+        Wait until all the submitted logs are written
+        """
+        if self._queue is not None:
+            await self._queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queue_size': self._queue.qsize() if self._queue is not None else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch: List[AccessLogToDBBase] = []
+        deadline = 0.0
+        getter: Optional[asyncio.Future] = None
+        stopping = False
+
+        while not stopping:
+            # The pending getter is kept between the iterations, so a timeout never loses a log
+            if getter is None:
+                getter = asyncio.ensure_future(self._queue.get())
+
+            timeout = max(deadline - loop.time(), 0) if batch else None
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+
+            if getter in done:
+                access_log, getter = getter.result(), None
+                if not batch:
+                    deadline = loop.time() + self._flush_interval
+
+                stopping = self._fill(batch, access_log)
+
+                if not stopping and len(batch) < self._batch_size and deadline > loop.time():
+                    continue
+
+            await self._flush(batch)
+            batch = []
+
+        self._queue.task_done()
+
+    def _fill(
+            self, batch: List[AccessLogToDBBase], access_log: Optional[AccessLogToDBBase]
+    ) -> bool:
+        """
+        Add the log and the already queued ones to the batch, return True on the stop sentinel
+        """
+        while access_log is not None:
+            batch.append(access_log)
+            if len(batch) >= self._batch_size:
+                return False
+            try:
+                access_log = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False
+
+        return True
+
+    async def _flush(self, batch: List[AccessLogToDBBase]) -> None:
+        if not batch:
+            return
+
+        try:
+            async with self._session_maker() as db:
+                await access_log_crud.insert_many(db=db, objs_in=batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception(f'Failed to write {len(batch)} access logs')
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+
+access_log_writer = AccessLogWriter(
+    session_maker=async_session_maker,
+    batch_size=app_settings.access_log_batch_size,
+    flush_interval=app_settings.access_log_flush_interval,
+    max_queue_size=app_settings.access_log_queue_size,
+    overflow_policy=app_settings.access_log_overflow_policy,
+)
@@ -0,0 +1,58 @@
+from enum import Enum
+from typing import Optional, Union
+
+from fastapi import HTTPException, status
+from sqlalchemy import false, or_
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.elements import ColumnElement
+
+from models.general import ShortLink
+from schemas.short_link import LinkType
+from services.cache import CachedLink
+from services.principal import Principal
+
+# Anything with the `owner_id` and `link_type` of the link: the entity, the cached link
+# or a row of its columns. The owner is compared by id, so it is never loaded
+OwnedLink = Union[ShortLink, CachedLink, Row]
+
+
+class Action(str, Enum):
+    # Follow the link or read its usage
+    READ = 'read'
+    DELETE = 'delete'
+    CHANGE = 'change'
+
+
+def is_allowed(principal: Optional[Principal], link: OwnedLink, action: Action) -> bool:
+    """
+    The private links are read by their owners only, the owned links are deleted
+    by their owners only and only the owners change their links
+    """
+    is_owner = principal is not None and principal.id == link.owner_id
+
+    if action == Action.READ:
+        return link.link_type != LinkType.PRIVATE.value or is_owner
+    if action == Action.DELETE:
+        return link.owner_id is None or is_owner
+    return is_owner
+
+
+def authorize(principal: Optional[Principal], link: OwnedLink, action: Action) -> None:
+    if not is_allowed(principal, link, action):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail='You have not access'
+        )
+
+
+def access_filter(principal: Optional[Principal], action: Action) -> ColumnElement[bool]:
+    """
+    The rules of `is_allowed` as the condition of a links query,
+    so the links of a list are checked all at once by the database
+    """
+    is_owner = ShortLink.owner_id == principal.id if principal is not None else false()
+
+    if action == Action.READ:
+        return or_(ShortLink.link_type != LinkType.PRIVATE.value, is_owner)
+    if action == Action.DELETE:
+        return or_(ShortLink.owner_id.is_(None), is_owner)
+    return is_owner
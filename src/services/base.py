@@ -1,10 +1,13 @@
-from typing import Generic, List, Optional, Type, TypeVar, Union, Dict, Any
+from typing import Generic, List, Optional, Type, TypeVar, Union, Dict, Any, Sequence
 from pydantic import BaseModel
 
 from fastapi.encoders import jsonable_encoder
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.base import ExecutableOption
+from sqlalchemy.sql.elements import ColumnElement
 from sqlalchemy.sql.selectable import Select
 
 from db.db import Base
@@ -22,6 +25,9 @@ class Repository:
     def get_multi(self, *args, **kwargs):
         raise NotImplementedError
 
+    def count(self, *args, **kwargs):
+        raise NotImplementedError
+
     def create(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -44,24 +50,61 @@ class RepositoryDB(Repository, Generic[ModelType, CreateSchemaType, UpdateSchema
     def __init__(self, model: Type[ModelType]):
         self._model = model
 
-    async def get(self, db: AsyncSession, **kwargs) -> Optional[ModelType]:
+    async def get(
+            self,
+            db: AsyncSession,
+            options: Sequence[ExecutableOption] = (),
+            **kwargs
+    ) -> Optional[ModelType]:
+        """
+        Relationships are not loaded unless requested with loader options,
+        e.g. `options=[selectinload(ShortLink.owner)]`
+        """
 
-        statement = select(self._model)
+        statement = select(self._model).options(*options)
         statement = set_params(statement, self._model, kwargs)
 
         results = await db.execute(statement=statement)
         return results.unique().scalar_one_or_none()
 
+    async def get_fields(
+            self,
+            db: AsyncSession,
+            fields: Sequence[str],
+            **kwargs
+    ) -> Optional[Row]:
+        """
+        Get only the given columns of the object, without building the ORM entity
+        """
+
+        statement = select(*(getattr(self._model, field) for field in fields))
+        statement = set_params(statement, self._model, kwargs)
+
+        results = await db.execute(statement=statement)
+        return results.one_or_none()
+
     async def get_multi(
             self,
             db: AsyncSession,
             offset: Optional[int] = None,
             limit: Optional[int] = None,
+            after_id: Optional[int] = None,
+            options: Sequence[ExecutableOption] = (),
+            filters: Sequence[ColumnElement[bool]] = (),
             **kwargs
     ) -> List[ModelType]:
-        statement = select(self._model)
+        """
+        Prefer the keyset pagination by `after_id` (the id of the last object
+        of the previous page) over `offset`, which scans all the skipped rows.
+        `filters` are the conditions other than the equality of kwargs,
+        e.g. `filters=[AccessLog.create_at >= date_from]`
+        """
+        statement = select(self._model).options(*options).where(*filters)
         statement = set_params(statement, self._model, kwargs)
 
+        if after_id is not None:
+            statement = statement.where(self._model.id > after_id)
+
         if offset:
             statement = statement.offset(offset)
 
@@ -73,6 +116,16 @@ class RepositoryDB(Repository, Generic[ModelType, CreateSchemaType, UpdateSchema
         results = await db.execute(statement=statement)
         return results.unique().scalars().all()
 
+    async def count(self, db: AsyncSession, **kwargs) -> int:
+        """
+        Count the objects on the server side
+        """
+        statement = select(func.count()).select_from(self._model)
+        statement = set_params(statement, self._model, kwargs)
+
+        results = await db.execute(statement=statement)
+        return results.scalar_one()
+
     async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self._model(**obj_in_data)
@@ -81,6 +134,33 @@ class RepositoryDB(Repository, Generic[ModelType, CreateSchemaType, UpdateSchema
         await db.refresh(db_obj)
         return db_obj
 
+    async def create_many(
+            self,
+            db: AsyncSession,
+            *,
+            objs_in: Sequence[CreateSchemaType],
+            returning: Sequence[str] = ('id',),
+            chunk_size: int = 1000
+    ) -> List[Row]:
+        """
+        Create the objects with one multi-row INSERT ... RETURNING per chunk in one transaction.
+        All the objects must have the same fields set. The rows are returned in no particular
+        order, so `returning` should include a unique column to match them with the objects.
+        """
+        rows = []
+        columns = [getattr(self._model, field) for field in returning]
+
+        for start in range(0, len(objs_in), chunk_size):
+            chunk = objs_in[start:start + chunk_size]
+            statement = insert(self._model).values([
+                obj_in.model_dump(exclude_unset=True) for obj_in in chunk
+            ]).returning(*columns)
+            results = await db.execute(statement)
+            rows.extend(results.all())
+
+        await db.commit()
+        return rows
+
     async def update(
             self,
             db: AsyncSession,
@@ -91,7 +171,7 @@ class RepositoryDB(Repository, Generic[ModelType, CreateSchemaType, UpdateSchema
         stmt = (
             update(self._model).
             where(self._model.id == db_obj.id).
-            values(obj_in.dict(exclude_unset=True)).
+            values(obj_in.model_dump(exclude_unset=True)).
             returning(self._model)
         )
         await db.execute(stmt)
@@ -108,8 +188,7 @@ class RepositoryDB(Repository, Generic[ModelType, CreateSchemaType, UpdateSchema
         stmt = (
             update(self._model).
             where(self._model.id == db_obj.id).
-            values(is_active=False).
-            returning(self._model)
+            values(is_active=False)
         )
         await db.execute(stmt)
         await db.commit()
@@ -0,0 +1,234 @@
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import app_settings
+from db.db import engine
+from models.general import BlacklistRule
+
+logger = logging.getLogger()
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_network(entry: str) -> Optional[Network]:
+    try:
+        return ipaddress.ip_network(entry.strip(), strict=False)
+    except ValueError:
+        logger.warning(f'Invalid black list entry is skipped: {entry!r}')
+        return None
+
+
+class NetworkRanges:
+    """
+    The networks compiled into the sorted disjoint integer ranges of one IP version,
+    each one pointing to the most specific network that covers it.
+    A lookup is one binary search, whatever the number and nesting of the networks.
+    """
+
+    def __init__(self, networks: Iterable[Network]):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.networks: List[Network] = []
+
+        # The CIDR networks are either nested or disjoint, so the enclosing ones
+        # are kept on a stack while their nested ones are added
+        stack: List[Tuple[int, Network]] = []
+        cursor = 0
+        ranges = sorted(
+            ((int(network.network_address), int(network.broadcast_address), network)
+             for network in set(networks)),
+            key=lambda item: (item[0], -item[1])
+        )
+        for start, end, network in ranges:
+            while stack and stack[-1][0] < start:
+                enclosing_end, enclosing = stack.pop()
+                cursor = self._add(cursor, enclosing_end, enclosing)
+            if stack:
+                self._add(cursor, start - 1, stack[-1][1])
+            cursor = start
+            stack.append((end, network))
+
+        while stack:
+            end, enclosing = stack.pop()
+            cursor = self._add(cursor, end, enclosing)
+
+    def _add(self, start: int, end: int, network: Network) -> int:
+        if start <= end:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.networks.append(network)
+        return end + 1
+
+    def match(self, address: int) -> Optional[Network]:
+        index = bisect_right(self.starts, address) - 1
+        if index >= 0 and address <= self.ends[index]:
+            return self.networks[index]
+        return None
+
+
+def compile_ranges(networks: Iterable[Network]) -> Dict[int, NetworkRanges]:
+    networks = list(networks)
+    return {
+        version: NetworkRanges(network for network in networks if network.version == version)
+        for version in (4, 6)
+    }
+
+
+class IPBlacklist:
+    """
+    Blocked IPv4/IPv6 addresses and CIDR networks, gathered from the settings,
+    an optional file (one entry per line, `#` starts a comment) and the `blacklist_rule`
+    table. The file and the table are re-read every `reload_interval` seconds
+    and the lookup structure is rebuilt only when the entries change.
+
+    The hits are counted per rule, by the most specific matching network.
+    """
+
+    def __init__(
+            self,
+            entries: Iterable[str] = (),
+            file_path: Optional[str] = None,
+            engine: Optional[AsyncEngine] = None,
+            reload_interval: float = 30,
+    ):
+        self._static_networks = [
+            network for network in map(parse_network, entries) if network is not None
+        ]
+        self._file_path = file_path
+        self._engine = engine
+        self._reload_interval = reload_interval
+
+        self._file_mtime: Optional[float] = None
+        self._file_networks: List[Network] = []
+        self._db_networks: List[Network] = []
+        self._networks: frozenset = frozenset()
+        self._ranges: Dict[int, NetworkRanges] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits: Dict[Network, int] = {}
+        networks = self._all_networks()
+        self._swap(networks, compile_ranges(networks))
+
+    def _all_networks(self) -> frozenset:
+        return frozenset((*self._static_networks, *self._file_networks, *self._db_networks))
+
+    def _swap(self, networks: frozenset, ranges: Dict[int, NetworkRanges]) -> None:
+        # On the event loop, so `match` sees either the old rules or the new ones
+        self._networks, self._ranges = networks, ranges
+        self.hits = {network: self.hits.get(network, 0) for network in networks}
+
+    def match(self, host: Optional[str]) -> Optional[Network]:
+        """
+        Get the most specific blocked network of the address, count the hit
+        """
+        if not self._networks or not host:
+            return None
+
+        try:
+            # Much faster than ipaddress for the IPv4 addresses
+            version, address = 4, int.from_bytes(socket.inet_pton(socket.AF_INET, host), 'big')
+        except OSError:
+            try:
+                ip_address = ipaddress.ip_address(host)
+            except ValueError:
+                return None
+            if ip_address.version == 6 and ip_address.ipv4_mapped is not None:
+                ip_address = ip_address.ipv4_mapped
+            version, address = ip_address.version, int(ip_address)
+
+        network = self._ranges[version].match(address)
+        if network is not None:
+            self.hits[network] = self.hits.get(network, 0) + 1
+        return network
+
+    def _read_file(self) -> Optional[Tuple[float, List[Network]]]:
+        """
+        Get the modification time and the networks of the file,
+        None if it is unchanged or unavailable
+        """
+        try:
+            mtime = os.stat(self._file_path).st_mtime
+        except OSError as e:
+            logger.warning(f'Black list file is unavailable: {e}')
+            return None
+
+        if mtime == self._file_mtime:
+            return None
+
+        with open(self._file_path) as file:
+            entries = [line.split('#', 1)[0].strip() for line in file]
+        return mtime, [
+            network for network in map(parse_network, filter(None, entries)) if network is not None
+        ]
+
+    async def _read_table(self) -> None:
+        async with self._engine.connect() as connection:
+            results = await connection.execute(select(BlacklistRule.network))
+            self._db_networks = [ipaddress.ip_network(network) for network in results.scalars()]
+
+    async def reload(self) -> None:
+        """
+        Re-read the file and the table. The parsing and compiling of tens of thousands
+        of rules take a while, so they run in a thread, not to stall the requests.
+        The thread only builds the new rules, they are swapped in on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._file_path is not None:
+            file_rules = await loop.run_in_executor(None, self._read_file)
+            if file_rules is not None:
+                self._file_mtime, self._file_networks = file_rules
+        if self._engine is not None:
+            await self._read_table()
+
+        networks = self._all_networks()
+        if networks == self._networks:
+            return
+
+        self._swap(networks, await loop.run_in_executor(None, compile_ranges, networks))
+        logger.info(f'Black list is reloaded: {len(self._networks)} rules')
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception('Failed to reload the black list, the previous one is kept')
+            await asyncio.sleep(self._reload_interval)
+
+    def start(self) -> None:
+        if self._task is None and (self._file_path is not None or self._engine is not None):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self, top: int = 100) -> Dict[str, object]:
+        hits = sorted(
+            ((str(network), count) for network, count in self.hits.items() if count),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return {'rules': len(self._networks), 'hits': dict(hits[:top])}
+
+
+ip_blacklist = IPBlacklist(
+    entries=app_settings.black_list,
+    file_path=app_settings.black_list_file,
+    engine=engine if app_settings.black_list_from_db else None,
+    reload_interval=app_settings.black_list_reload_interval,
+)
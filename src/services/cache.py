@@ -0,0 +1,390 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+import orjson
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from core.config import app_settings
+
+logger = logging.getLogger()
+
+
+class CachedLink(NamedTuple):
+    id: int
+    original_url: str
+    link_type: str
+    owner_id: Optional[UUID]
+    is_active: bool
+
+
+class LinkCache:
+    """
+    Bounded in-process cache of the short link resolutions (short_url -> CachedLink).
+    The least recently used entries are evicted when the cache is full
+    and every entry expires after `ttl` seconds.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items: 'OrderedDict[str, Tuple[float, CachedLink]]' = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[CachedLink]:
+        item = self._items.get(key)
+
+        if item is None:
+            self.misses += 1
+            return None
+
+        expire_at, value = item
+        if expire_at <= time.monotonic():
+            del self._items[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: CachedLink) -> None:
+        if self._max_size <= 0:
+            return
+
+        self._items[key] = (time.monotonic() + self._ttl, value)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._items),
+            'max_size': self._max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class CacheVersion(NamedTuple):
+    """
+    The state of a key taken before its value is read from the database
+    """
+    generation: int
+    shared: Optional[int]
+
+
+class CacheBackend:
+
+    async def get(self, key: str) -> Optional[CachedLink]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: CachedLink, version: Optional[int] = None) -> bool:
+        raise NotImplementedError
+
+    async def version(self, key: str) -> Optional[int]:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = LinkCache(max_size=max_size, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[CachedLink]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: CachedLink, version: Optional[int] = None) -> bool:
+        self._cache.set(key, value)
+        return True
+
+    async def version(self, key: str) -> Optional[int]:
+        # The local entries are guarded by the generation of ShortLinkCache
+        return 0
+
+    async def delete(self, key: str) -> None:
+        self.discard(key)
+
+    def discard(self, key: str) -> None:
+        self._cache.invalidate(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Cache shared by all the workers. Redis failures are logged and treated as cache misses,
+    so the redirects keep working through the database.
+
+    Every delete bumps the version of the key. A value set with an older version
+    is removed again, as it was read before the change that deleted the key.
+    """
+
+    def __init__(
+            self,
+            client: aioredis.Redis,
+            ttl: int,
+            prefix: str = 'short_link:',
+            version_prefix: str = 'short_link_version:'
+    ):
+        self._client = client
+        self._ttl = ttl
+        self._prefix = prefix
+        self._version_prefix = version_prefix
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[CachedLink]:
+        try:
+            raw_value = await self._client.get(self._prefix + key)
+        except RedisError as e:
+            self.errors += 1
+            logger.warning(f'Shared cache is unavailable: {e}')
+            return None
+
+        if raw_value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        value = orjson.loads(raw_value)
+        if value['owner_id'] is not None:
+            value['owner_id'] = UUID(value['owner_id'])
+        return CachedLink(**value)
+
+    async def set(self, key: str, value: CachedLink, version: Optional[int] = None) -> bool:
+        """
+        Cache the value read after `version` of the key was taken.
+        The version is checked again after the write: a delete in between either
+        removed the value already or bumped the version, then the value is removed here.
+        """
+        if version is None:
+            return False
+
+        try:
+            await self._client.set(
+                self._prefix + key, orjson.dumps(value._asdict()), ex=self._ttl
+            )
+            if await self.version(key) == version:
+                return True
+            await self._client.delete(self._prefix + key)
+        except RedisError as e:
+            self.errors += 1
+            logger.warning(f'Shared cache is unavailable: {e}')
+        return False
+
+    async def version(self, key: str) -> Optional[int]:
+        try:
+            raw_version = await self._client.get(self._version_prefix + key)
+        except RedisError as e:
+            self.errors += 1
+            logger.warning(f'Shared cache is unavailable: {e}')
+            return None
+        return int(raw_version or 0)
+
+    async def delete(self, key: str) -> None:
+        """
+        Bump the version before the delete, so a value being set concurrently is
+        either deleted here or sees the new version and deletes itself
+        """
+        try:
+            await self._client.incr(self._version_prefix + key)
+            await self._client.expire(self._version_prefix + key, self._ttl)
+            await self._client.delete(self._prefix + key)
+        except RedisError as e:
+            self.errors += 1
+            logger.error(f'Failed to delete the cached short link {key}: {e}')
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+        }
+
+
+class InvalidationBus:
+
+    async def publish(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def start(self, on_invalidate: Callable[[Optional[str]], None]) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        raise NotImplementedError
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """
+    Broadcasts the changed short links to every worker through the Redis pub/sub channel.
+    When the subscription is lost, `on_invalidate(None)` is called to drop the whole
+    local cache, because the messages sent in the meantime are missed.
+    """
+
+    def __init__(self, client: aioredis.Redis, channel: str, reconnect_delay: float = 1):
+        self._client = client
+        self._channel = channel
+        self._reconnect_delay = reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, key: str) -> None:
+        await self._client.publish(self._channel, key)
+
+    async def start(self, on_invalidate: Callable[[Optional[str]], None]) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(on_invalidate))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, on_invalidate: Callable[[Optional[str]], None]) -> None:
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    key = message['data']
+                    on_invalidate(key.decode() if isinstance(key, bytes) else key)
+            except RedisError as e:
+                logger.warning(f'Cache invalidation channel is lost: {e}')
+                on_invalidate(None)
+                await asyncio.sleep(self._reconnect_delay)
+            finally:
+                await pubsub.close()
+
+
+class ShortLinkCache:
+    """
+    Short link resolution cache: the in-process cache in front of the optional shared one.
+    Invalidations are broadcast so that every worker drops its local entry.
+
+    The values read from the database are set with the version taken before the read,
+    so a read that raced with an invalidation does not cache the stale link.
+    """
+
+    def __init__(
+            self,
+            local: MemoryCacheBackend,
+            shared: Optional[CacheBackend] = None,
+            bus: Optional[InvalidationBus] = None
+    ):
+        self.local = local
+        self.shared = shared
+        self.bus = bus
+
+        # Bumped by every local invalidation, so a value read before it is not cached after it
+        self.generation = 0
+
+    async def get(self, key: str) -> Optional[CachedLink]:
+        value = await self.local.get(key)
+
+        if value is None and self.shared is not None:
+            generation = self.generation
+            value = await self.shared.get(key)
+            if value is not None and generation == self.generation:
+                await self.local.set(key, value)
+
+        return value
+
+    async def version(self, key: str) -> CacheVersion:
+        generation = self.generation
+        shared = await self.shared.version(key) if self.shared is not None else None
+        return CacheVersion(generation, shared)
+
+    async def set(self, key: str, value: CachedLink, version: CacheVersion) -> None:
+        if version.generation != self.generation:
+            return
+        if self.shared is not None and not await self.shared.set(key, value, version.shared):
+            return
+        if version.generation == self.generation:
+            await self.local.set(key, value)
+
+    async def invalidate(self, key: str) -> None:
+        """
+        Drop the key everywhere. Called after the change is committed, so the Redis
+        failures are only logged: the change itself is done
+        """
+        self._drop_local(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
+        if self.bus is not None:
+            try:
+                await self.bus.publish(key)
+            except RedisError as e:
+                logger.error(f'Failed to broadcast the invalidation of {key}: {e}')
+
+    def _drop_local(self, key: Optional[str]) -> None:
+        self.generation += 1
+        if key is None:
+            self.local.clear()
+        else:
+            self.local.discard(key)
+
+    async def start(self) -> None:
+        if self.bus is not None:
+            await self.bus.start(self._drop_local)
+
+    async def stop(self) -> None:
+        if self.bus is not None:
+            await self.bus.stop()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {'local': self.local.stats()}
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
+
+
+def build_link_cache() -> ShortLinkCache:
+    local = MemoryCacheBackend(
+        max_size=app_settings.link_cache_size, ttl=app_settings.link_cache_ttl
+    )
+
+    if app_settings.cache_backend == 'redis':
+        client = aioredis.from_url(app_settings.redis_dsn)
+        return ShortLinkCache(
+            local=local,
+            shared=RedisCacheBackend(client, ttl=app_settings.link_cache_ttl),
+            bus=RedisInvalidationBus(client, channel=app_settings.cache_invalidation_channel),
+        )
+
+    return ShortLinkCache(local=local)
@@ -0,0 +1,74 @@
+import csv
+import io
+from typing import AsyncContextManager, AsyncIterator, Optional, Sequence
+
+import orjson
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from services.shortlink import access_log_crud
+
+EXPORT_FIELDS = ('id', 'create_at', 'client_ip', 'user_agent', 'referer', 'extras')
+EXPORT_MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def ndjson_chunk(rows: Sequence[Row]) -> bytes:
+    return b''.join(
+        orjson.dumps({
+            'id': row.id,
+            'create_at': row.create_at,
+            'client_ip': str(row.client_ip) if row.client_ip else None,
+            'user_agent': row.user_agent,
+            'referer': row.referer,
+            'extras': row.extras,
+        }, option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
+
+
+def csv_chunk(rows: Sequence[Row]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(
+        (
+            row.id,
+            row.create_at.isoformat(),
+            row.client_ip or '',
+            row.user_agent or '',
+            row.referer or '',
+            orjson.dumps(row.extras).decode() if row.extras else '',
+        )
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_access_logs(
+        session: AsyncContextManager[AsyncSession],
+        short_link_id: int,
+        export_format: str,
+        after_id: Optional[int] = None,
+        filters: Sequence[ColumnElement[bool]] = (),
+) -> AsyncIterator[bytes]:
+    """
+    Yield the link's access logs ordered by id as NDJSON lines or CSV rows,
+    one piece per fetched chunk. The export is resumed by passing the last exported id
+    as `after_id`.
+    The logs are read in the `session` entered here: the response is streamed after
+    the endpoint's dependencies are closed.
+    """
+    if export_format == 'csv':
+        yield (','.join(EXPORT_FIELDS) + '\r\n').encode()
+        serialize = csv_chunk
+    else:
+        serialize = ndjson_chunk
+
+    async with session as db:
+        async for rows in access_log_crud.stream_rows(
+                db=db, short_link_id=short_link_id, after_id=after_id, filters=filters
+        ):
+            yield serialize(rows)
@@ -1,17 +1,56 @@
+import hashlib
+import ipaddress
 import string
 import random
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional, Union
+from urllib.parse import quote, urlsplit, urlunsplit
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.elements import ColumnElement
 
+from core.client_ip import client_ip
+from core.config import app_settings
+from schemas.access_log import AccessLogToDBBase
 from schemas.short_link import ShortLinkToDBBase
+from services.cache import CachedLink
 
 
 def id_generator(size: int = 6, chars=string.ascii_letters):
     return ''.join(random.choice(chars) for _ in range(size))
 
 
-def short_link_validation(short_link: Optional[ShortLinkToDBBase]):
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Bring the equivalent spellings of the URL to one form: the lowercase scheme and host,
+    no default port and `/` for the empty path
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+
+    if ':' in netloc:
+        netloc = f'[{netloc}]'
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{parts.port}'
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo = f'{userinfo}:{parts.password}'
+        netloc = f'{userinfo}@{netloc}'
+
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def url_hash(url: str) -> bytes:
+    return hashlib.sha256(normalize_url(url).encode()).digest()
+
+
+def short_link_validation(short_link: Optional[Union[ShortLinkToDBBase, CachedLink]]):
     if not short_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail='Item not found'
@@ -21,3 +60,58 @@ def short_link_validation(short_link: Optional[ShortLinkToDBBase]):
         raise HTTPException(
             status_code=status.HTTP_410_GONE, detail='Item deleted'
         )
+
+
+# The characters RedirectResponse leaves unquoted in the location
+LOCATION_SAFE_CHARS = ":/%#?=@[]!$&'()*+,;"
+
+
+def redirect_response(url: str) -> Response:
+    """
+    Bare 307 response: the stored URLs are almost always ASCII already,
+    so the quoting of RedirectResponse is skipped for them
+    """
+    location = url if url.isascii() else quote(url, safe=LOCATION_SAFE_CHARS)
+    return Response(
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers={'location': location}
+    )
+
+
+def access_log_from_request(request: Request, short_link_id: int) -> AccessLogToDBBase:
+    headers = request.headers
+    address = client_ip(request)
+
+    try:
+        ipaddress.ip_address(address)
+    except ValueError:
+        address = None
+
+    extras = {
+        header: headers[header]
+        for header in app_settings.access_log_extra_headers
+        if header in headers
+    }
+
+    return AccessLogToDBBase(
+        short_link_id=short_link_id,
+        client_ip=address,
+        user_agent=headers.get('user-agent'),
+        referer=headers.get('referer'),
+        extras=extras or None,
+    )
+
+
+def date_range_filters(
+        column: InstrumentedAttribute,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime]
+) -> List[ColumnElement[bool]]:
+    filters = []
+
+    if date_from is not None:
+        filters.append(column >= date_from)
+
+    if date_to is not None:
+        filters.append(column < date_to)
+
+    return filters
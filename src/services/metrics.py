@@ -0,0 +1,164 @@
+import time
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+
+from services.access_log_writer import AccessLogWriter
+from services.cache import ShortLinkCache
+
+METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'}
+
+registry = CollectorRegistry()
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Request handling time',
+    ['method', 'route'],
+    registry=registry,
+)
+RESPONSES = Counter(
+    'http_responses',
+    'Responses by status code',
+    ['method', 'route', 'status'],
+    registry=registry,
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries per request',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+    registry=registry,
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds',
+    'Database query time per request',
+    ['route'],
+    registry=registry,
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds',
+    'Database query time, including the queries of the background tasks',
+    registry=registry,
+)
+THROTTLED_REQUESTS = Counter(
+    'http_throttled_requests',
+    'Requests rejected by the rate limits',
+    ['limit', 'key'],
+    registry=registry,
+)
+
+
+class RequestDBUsage:
+    __slots__ = ('queries', 'duration')
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+# Shared with the tasks of the request, which add to the same object
+request_db_usage: ContextVar[Optional[RequestDBUsage]] = ContextVar(
+    'request_db_usage', default=None
+)
+
+
+def route_label(request: Request) -> str:
+    """
+    The route template, e.g. `/{short_url}`, keeps the label values bounded
+    whatever short urls are requested
+    """
+    route = request.scope.get('route')
+    return getattr(route, 'path', '<unmatched>')
+
+
+def method_label(request: Request) -> str:
+    return request.method if request.method in METHODS else 'OTHER'
+
+
+def observe_request(request: Request, status_code: int, duration: float) -> None:
+    method, route = method_label(request), route_label(request)
+
+    REQUEST_DURATION.labels(method, route).observe(duration)
+    RESPONSES.labels(method, route, str(status_code)).inc()
+
+    usage = request_db_usage.get()
+    if usage is not None:
+        REQUEST_DB_QUERIES.labels(route).observe(usage.queries)
+        REQUEST_DB_DURATION.labels(route).observe(usage.duration)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Time every query of the engine and add it to the usage of the current request
+    """
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        DB_QUERY_DURATION.observe(duration)
+
+        usage = request_db_usage.get()
+        if usage is not None:
+            usage.queries += 1
+            usage.duration += duration
+
+
+class ServiceCollector:
+    """
+    Reads the counters the services already keep at scrape time:
+    the redirect cache, the access log queue and the connection pool
+    """
+
+    def __init__(self, link_cache: ShortLinkCache, writer: AccessLogWriter, engine: AsyncEngine):
+        self._link_cache = link_cache
+        self._writer = writer
+        self._engine = engine
+
+    def collect(self) -> Iterator[Metric]:
+        # One family per name, with a sample per cache level
+        cache_metrics = {
+            name: CounterMetricFamily(
+                f'link_cache_{name}', f'Short link cache {name}', labels=['level']
+            )
+            for name in ('hits', 'misses')
+        }
+        hit_ratio = GaugeMetricFamily(
+            'link_cache_hit_ratio', 'Short link cache hit ratio', labels=['level']
+        )
+        for level, stats in self._link_cache.stats().items():
+            for name, metric in cache_metrics.items():
+                metric.add_metric([level], stats.get(name, 0))
+
+            lookups = stats.get('hits', 0) + stats.get('misses', 0)
+            hit_ratio.add_metric([level], stats.get('hits', 0) / lookups if lookups else 0)
+
+        yield from cache_metrics.values()
+        yield hit_ratio
+
+        writer_stats = self._writer.stats()
+        yield GaugeMetricFamily(
+            'access_log_queue_size', 'Access logs waiting to be written',
+            value=writer_stats['queue_size']
+        )
+        for name in ('written', 'dropped', 'failed'):
+            yield CounterMetricFamily(
+                f'access_log_{name}', f'Access logs {name}', value=writer_stats[name]
+            )
+
+        pool_stats = self._engine.pool.stats()
+        for name in ('checked_out', 'idle', 'overflow'):
+            yield GaugeMetricFamily(
+                f'db_pool_{name}', f'Database pool connections {name}', value=pool_stats[name]
+            )
+        yield CounterMetricFamily(
+            'db_pool_timeouts', 'Database pool checkout timeouts', value=pool_stats['timeouts']
+        )
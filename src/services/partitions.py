@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import logging
+import os
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from core.config import app_settings
+from db.db import engine
+
+logger = logging.getLogger()
+
+# Any constant shared by the workers, so only one of them maintains the partitions at a time
+MAINTENANCE_LOCK_ID = 4242
+
+
+def month_start(day: date, months: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'access_log_p{month:%Y%m}'
+
+
+class AccessLogPartitionManager:
+    """
+    Maintains the monthly range partitions of `access_log` by `create_at`:
+    creates them `months_ahead` in advance and removes the ones older than
+    `retention_months`. If `archive_dir` is set, the removed partitions are exported
+    to gzipped CSV files before they are detached and dropped.
+
+    Every step is committed separately, and the export only reads the expired partition,
+    so `access_log` is locked only for the moment of the partition creation or removal.
+    The click rollups keep counting the removed logs.
+    """
+
+    def __init__(
+            self,
+            engine: AsyncEngine,
+            months_ahead: int,
+            retention_months: Optional[int] = None,
+            archive_dir: Optional[str] = None,
+    ):
+        self._engine = engine
+        self._months_ahead = months_ahead
+        self._retention_months = retention_months
+        self._archive_dir = archive_dir
+
+    async def create_partition(self, connection: AsyncConnection, month: date) -> None:
+        await connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF access_log '
+            f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')"
+        ))
+        await connection.commit()
+
+    async def get_partitions(self, connection: AsyncConnection) -> List[str]:
+        results = await connection.execute(text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON pg_inherits.inhparent = parent.oid '
+            'JOIN pg_class child ON pg_inherits.inhrelid = child.oid '
+            "WHERE parent.relname = 'access_log' ORDER BY child.relname"
+        ))
+        return results.scalars().all()
+
+    async def ensure_partitions(self, connection: AsyncConnection, today: date) -> None:
+        for months in range(self._months_ahead + 1):
+            month = month_start(today, months)
+            try:
+                await self.create_partition(connection, month)
+            except DBAPIError as e:
+                # E.g. the default partition already has the rows of this month
+                await connection.rollback()
+                logger.error(f'Failed to create the access log partition for {month}: {e}')
+
+    async def apply_retention(self, connection: AsyncConnection, today: date) -> List[str]:
+        """
+        Archive, detach and drop the partitions older than the retention period
+        """
+        if self._retention_months is None:
+            return []
+
+        oldest_kept = partition_name(month_start(today, -self._retention_months))
+        expired = [
+            partition for partition in await self.get_partitions(connection)
+            if partition[-6:].isdigit() and partition < oldest_kept
+        ]
+
+        for partition in expired:
+            # Archived while still attached, so a failed export leaves the partition
+            # in place for the next run instead of detached and forgotten
+            if self._archive_dir is not None:
+                await self.archive(connection, partition)
+                await connection.commit()
+            await connection.execute(text(f'ALTER TABLE access_log DETACH PARTITION {partition}'))
+            await connection.execute(text(f'DROP TABLE {partition}'))
+            await connection.commit()
+            logger.info(f'Dropped the expired access log partition ({partition})')
+
+        return expired
+
+    async def archive(self, connection: AsyncConnection, partition: str) -> str:
+        os.makedirs(self._archive_dir, exist_ok=True)
+        path = os.path.join(self._archive_dir, f'{partition}.csv.gz')
+
+        raw_connection = await connection.get_raw_connection()
+
+        loop = asyncio.get_running_loop()
+
+        with gzip.open(path, 'wb') as archive:
+            async def write(chunk: bytes) -> None:
+                await loop.run_in_executor(None, archive.write, chunk)
+
+            await raw_connection.driver_connection.copy_from_table(
+                partition, output=write, format='csv', header=True
+            )
+
+        return path
+
+    async def maintain(self, today: Optional[date] = None) -> None:
+        today = today or datetime.utcnow().date()
+
+        async with self._engine.connect() as connection:
+            locked = await connection.execute(
+                text('SELECT pg_try_advisory_lock(:lock_id)'), {'lock_id': MAINTENANCE_LOCK_ID}
+            )
+            if not locked.scalar_one():
+                return
+
+            try:
+                await self.ensure_partitions(connection, today)
+                await self.apply_retention(connection, today)
+            finally:
+                await connection.rollback()
+                await connection.execute(
+                    text('SELECT pg_advisory_unlock(:lock_id)'), {'lock_id': MAINTENANCE_LOCK_ID}
+                )
+                await connection.commit()
+
+    async def run(self, interval: float) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception:
+                logger.exception('Failed to maintain the access log partitions')
+            await asyncio.sleep(interval)
+
+
+partition_manager = AccessLogPartitionManager(
+    engine=engine,
+    months_ahead=app_settings.access_log_partitions_ahead,
+    retention_months=app_settings.access_log_retention_months,
+    archive_dir=app_settings.access_log_archive_dir,
+)
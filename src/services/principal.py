@@ -0,0 +1,144 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+from uuid import UUID
+
+from redis import asyncio as aioredis
+
+from core.config import app_settings
+from services.cache import InvalidationBus, RedisInvalidationBus
+
+
+class Principal(NamedTuple):
+    """
+    The part of the user the endpoints need for the access checks
+    """
+    id: UUID
+    is_active: bool
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+class PrincipalCache:
+    """
+    Verified access tokens, by their SHA-256, and the principals of their users.
+
+    An entry lives until its token expires, but no longer than `ttl` seconds.
+    The least recently used entries are evicted when the cache is full.
+    The entries of a user are dropped when the user is changed or deleted,
+    on every worker if there is the invalidation bus.
+    """
+
+    def __init__(self, max_size: int, ttl: float, bus: Optional[InvalidationBus] = None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self.bus = bus
+        self._items: 'OrderedDict[bytes, Tuple[float, Principal]]' = OrderedDict()
+        self._tokens: Dict[UUID, Set[bytes]] = {}
+
+        # Bumped by every invalidation, so a principal read before it is not cached after it
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = token_key(token)
+        item = self._items.get(key)
+
+        if item is None or item[0] <= time.monotonic():
+            if item is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(
+            self, token: str, principal: Principal, expires: Optional[float], generation: int
+    ) -> None:
+        """
+        Cache the principal of the token verified at `generation`.
+        `expires` is the token expiration as a UNIX timestamp.
+        """
+        if self._max_size <= 0 or generation != self.generation:
+            return
+
+        lifetime = self._ttl
+        if expires is not None:
+            lifetime = min(lifetime, expires - time.time())
+        if lifetime <= 0:
+            return
+
+        key = token_key(token)
+        self._items[key] = (time.monotonic() + lifetime, principal)
+        self._items.move_to_end(key)
+        self._tokens.setdefault(principal.id, set()).add(key)
+
+        while len(self._items) > self._max_size:
+            self._discard(next(iter(self._items)))
+            self.evictions += 1
+
+    def _discard(self, key: bytes) -> None:
+        _, principal = self._items.pop(key)
+        tokens = self._tokens.get(principal.id)
+        if tokens is not None:
+            tokens.discard(key)
+            if not tokens:
+                del self._tokens[principal.id]
+
+    def _drop_local(self, user_id: Optional[str]) -> None:
+        self.generation += 1
+        if user_id is None:
+            self._items.clear()
+            self._tokens.clear()
+            return
+
+        for key in self._tokens.pop(UUID(user_id), ()):
+            self._items.pop(key, None)
+
+    async def invalidate_user(self, user_id: UUID) -> None:
+        self._drop_local(str(user_id))
+        if self.bus is not None:
+            await self.bus.publish(str(user_id))
+
+    async def start(self) -> None:
+        if self.bus is not None:
+            await self.bus.start(self._drop_local)
+
+    async def stop(self) -> None:
+        if self.bus is not None:
+            await self.bus.stop()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._items),
+            'max_size': self._max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def build_principal_cache() -> PrincipalCache:
+    bus = None
+    if app_settings.cache_backend == 'redis':
+        bus = RedisInvalidationBus(
+            aioredis.from_url(app_settings.redis_dsn),
+            channel=app_settings.principal_invalidation_channel,
+        )
+
+    return PrincipalCache(
+        max_size=app_settings.principal_cache_size,
+        ttl=app_settings.principal_cache_ttl,
+        bus=bus,
+    )
+
+
+principal_cache = build_principal_cache()
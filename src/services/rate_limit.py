@@ -0,0 +1,218 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from core.client_ip import client_ip
+from core.config import app_settings
+from services.metrics import THROTTLED_REQUESTS
+from services.principal import Principal
+from services.users import current_principal
+
+logger = logging.getLogger()
+
+# limit name -> key kind -> (tokens per second, bucket capacity)
+Limits = Dict[str, Dict[str, Tuple[float, int]]]
+
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = burst
+if bucket[1] then
+    tokens = math.min(burst, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+end
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RateLimitBackend:
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        """
+        Take a token from the bucket of the key.
+        Returns 0 when it is taken, otherwise the seconds until the next token
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets of this worker, ordered by their last use.
+
+    A bucket refilled up to its capacity is the same as no bucket, so the idle ones
+    are dropped once full. When there are more than `max_buckets` buckets
+    the least recently used ones are evicted, whatever their tokens.
+    """
+
+    def __init__(self, max_buckets: int, clock: Callable[[], float] = time.monotonic):
+        self._max_buckets = max_buckets
+        self._clock = clock
+        # key -> (tokens, updated, full_at)
+        self._buckets: 'OrderedDict[str, Tuple[float, float, float]]' = OrderedDict()
+
+        self.evictions = 0
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = self._clock()
+        bucket = self._buckets.pop(key, None)
+
+        if bucket is None:
+            tokens = float(burst)
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        self._evict(now)
+        return wait
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        while buckets:
+            key, (_, _, full_at) = next(iter(buckets.items()))
+            if full_at > now and len(buckets) <= self._max_buckets:
+                break
+            del buckets[key]
+            if full_at > now:
+                self.evictions += 1
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        return self.take(key, rate, burst)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'buckets': len(self._buckets),
+            'max_buckets': self._max_buckets,
+            'evictions': self.evictions,
+        }
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets shared by all the workers, updated atomically by a Lua script
+    on the Redis clock. The idle buckets expire once they would be full again.
+    Redis failures are logged and the requests are let through.
+    """
+
+    def __init__(self, client: aioredis.Redis, prefix: str = 'rate_limit:'):
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._prefix = prefix
+
+        self.errors = 0
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        try:
+            wait = await self._script(keys=[self._prefix + key], args=[rate, burst])
+        except RedisError as e:
+            self.errors += 1
+            logger.warning(f'Rate limit store is unavailable: {e}')
+            return 0
+        return float(wait)
+
+    def stats(self) -> Dict[str, int]:
+        return {'errors': self.errors}
+
+
+class RateLimiter:
+    """
+    Applies the limits of the routes. Every limit has buckets per key kind:
+    `ip` - the client address, `client` - the authenticated user or else the address,
+    `link` - the requested short link. The request must fit into all of them.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limits: Limits):
+        self.backend = backend
+        self.limits = limits
+
+        self.throttled: Dict[Tuple[str, str], int] = {}
+
+    async def check(self, name: str, keys: Dict[str, Optional[str]]) -> None:
+        for kind, (rate, burst) in self.limits.get(name, {}).items():
+            key = keys.get(kind)
+            if key is None:
+                continue
+
+            wait = await self.backend.acquire(f'{name}:{kind}:{key}', rate, burst)
+            if wait > 0:
+                THROTTLED_REQUESTS.labels(name, kind).inc()
+                self.throttled[name, kind] = self.throttled.get((name, kind), 0) + 1
+                logger.info(f'Request is throttled by the {name} limit of {kind} {key}')
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail='Too many requests',
+                    headers={'Retry-After': str(math.ceil(wait))},
+                )
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'backend': self.backend.stats(),
+            'throttled': {
+                f'{name}:{kind}': count for (name, kind), count in self.throttled.items()
+            },
+        }
+
+
+def request_keys(request: Request, user: Optional[Principal]) -> Dict[str, Optional[str]]:
+    host = client_ip(request)
+    return {
+        'ip': host,
+        'client': str(user.id) if user else host,
+        'link': request.path_params.get('short_url'),
+    }
+
+
+def rate_limit(name: str, authenticated: bool = True) -> Callable:
+    """
+    Dependency applying the `name` limit of the settings to the route.
+    Without `authenticated` the user is not resolved and the clients are told apart
+    by their address only, for the routes that do not need the user otherwise.
+    """
+
+    async def check_rate_limit(
+            request: Request, user: Optional[Principal] = Depends(current_principal)
+    ):
+        await rate_limiter.check(name, request_keys(request, user))
+
+    async def check_anonymous_rate_limit(request: Request):
+        await rate_limiter.check(name, request_keys(request, None))
+
+    return check_rate_limit if authenticated else check_anonymous_rate_limit
+
+
+def build_rate_limiter() -> RateLimiter:
+    if app_settings.rate_limit_backend == 'redis':
+        backend = RedisRateLimitBackend(aioredis.from_url(app_settings.redis_dsn))
+    else:
+        backend = MemoryRateLimitBackend(max_buckets=app_settings.rate_limit_max_buckets)
+
+    return RateLimiter(backend=backend, limits=app_settings.rate_limits)
+
+
+rate_limiter = build_rate_limiter()
@@ -0,0 +1,172 @@
+import asyncio
+import string
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import app_settings
+from db.db import engine
+from models.general import short_code_sequence
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+
+# Coprime with the base, so the multiplication permutes the codes of every length
+SCRAMBLE_MULTIPLIER = 2147483647
+SCRAMBLE_OFFSET = 916132832
+
+
+class ShortCodeEncoder:
+    """
+    Bijection between the non-negative integers and the base62 short codes.
+
+    The number takes `min_length` characters or as many as its base62 form needs,
+    so the codes grow by one character when the keyspace of the current length is used up.
+    Within a length the numbers are scrambled by an affine permutation modulo 62^length,
+    so the consecutive numbers do not give the adjacent, guessable codes.
+    """
+
+    def __init__(self, min_length: int):
+        self._min_length = min_length
+
+    def length(self, number: int) -> int:
+        length = self._min_length
+        while number >= BASE ** length:
+            length += 1
+        return length
+
+    def encode(self, number: int) -> str:
+        length = self.length(number)
+        number = (number * SCRAMBLE_MULTIPLIER + SCRAMBLE_OFFSET) % BASE ** length
+
+        chars = []
+        for _ in range(length):
+            number, digit = divmod(number, BASE)
+            chars.append(ALPHABET[digit])
+        return ''.join(reversed(chars))
+
+
+class ShortCodeGenerator:
+
+    async def generate(self) -> str:
+        raise NotImplementedError
+
+
+class HiLoShortCodeGenerator(ShortCodeGenerator):
+    """
+    Leases blocks of the numbers from the database sequence: one `nextval` gives
+    the block start and the sequence increment is the block size. The numbers of a block
+    are handed out in-process, so the database is queried once per block.
+
+    The blocks of the workers never overlap and the leased numbers are never reused,
+    even if the worker stops before using up its block. The sequence increment
+    may be raised, but never lowered, as the blocks would overlap the last leased ones.
+    """
+
+    def __init__(self, engine: AsyncEngine, encoder: ShortCodeEncoder, sequence: str):
+        self._engine = engine
+        self._encoder = encoder
+        self._sequence = sequence
+        self._lock = asyncio.Lock()
+        self._next = 0
+        self._end = 0
+
+        self.leased_blocks = 0
+
+    async def _lease_block(self) -> None:
+        async with self._engine.connect() as connection:
+            results = await connection.execute(
+                text(
+                    "SELECT nextval(format('%I.%I', schemaname, sequencename)), increment_by "
+                    'FROM pg_sequences '
+                    'WHERE schemaname = current_schema() AND sequencename = :sequence'
+                ),
+                {'sequence': self._sequence}
+            )
+            start, block_size = results.one()
+
+        self._next, self._end = start, start + block_size
+        self.leased_blocks += 1
+
+    async def generate(self) -> str:
+        if self._next >= self._end:
+            async with self._lock:
+                if self._next >= self._end:
+                    await self._lease_block()
+
+        number = self._next
+        self._next += 1
+        return self._encoder.encode(number)
+
+
+class SnowflakeShortCodeGenerator(ShortCodeGenerator):
+    """
+    Snowflake-style numbers built without any database query: 41 bits of milliseconds
+    since `epoch`, 10 bits of `worker_id` and 12 bits of the sequence within a millisecond.
+    Every worker must have its own `worker_id`. If the clock goes back, the last timestamp
+    is reused until the clock catches up, so the numbers never repeat.
+    """
+
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(self, encoder: ShortCodeEncoder, worker_id: int, epoch: datetime):
+        if not 0 <= worker_id < 2 ** self.WORKER_BITS:
+            raise ValueError(f'Worker id must be in range [0, {2 ** self.WORKER_BITS})')
+
+        self._encoder = encoder
+        self._worker_id = worker_id
+        self._epoch_ms = int(epoch.timestamp() * 1000)
+        self._lock = asyncio.Lock()
+        self._last_timestamp = -1
+        self._sequence = 0
+
+    def _timestamp(self) -> int:
+        return int(time.time() * 1000) - self._epoch_ms
+
+    async def generate(self) -> str:
+        async with self._lock:
+            timestamp = max(self._timestamp(), self._last_timestamp)
+
+            if timestamp == self._last_timestamp:
+                self._sequence = (self._sequence + 1) % 2 ** self.SEQUENCE_BITS
+                if self._sequence == 0:
+                    # The sequence of this millisecond is used up
+                    while timestamp <= self._last_timestamp:
+                        await asyncio.sleep(0.001)
+                        timestamp = self._timestamp()
+            else:
+                self._sequence = 0
+
+            self._last_timestamp = timestamp
+            number = (
+                (timestamp << (self.WORKER_BITS + self.SEQUENCE_BITS))
+                | (self._worker_id << self.SEQUENCE_BITS)
+                | self._sequence
+            )
+            return self._encoder.encode(number)
+
+
+def build_short_code_generator(generator: Optional[str] = None) -> ShortCodeGenerator:
+    generator = generator or app_settings.short_code_generator
+    encoder = ShortCodeEncoder(min_length=app_settings.short_code_min_length)
+
+    if generator == 'snowflake':
+        if app_settings.short_code_worker_id is None:
+            # A shared default would give the same numbers in every worker
+            raise ValueError('SHORT_CODE_WORKER_ID must be set for the snowflake generator')
+        return SnowflakeShortCodeGenerator(
+            encoder=encoder,
+            worker_id=app_settings.short_code_worker_id,
+            epoch=datetime(2023, 1, 1, tzinfo=timezone.utc),
+        )
+
+    return HiLoShortCodeGenerator(
+        engine=engine, encoder=encoder, sequence=short_code_sequence.name
+    )
+
+
+short_code_generator = build_short_code_generator()
@@ -1,16 +1,332 @@
-from models.general import ShortLink as ShortLinkModel, AccessLog as AccessLogModel
-from schemas.access_log import AccessLogCreate, AccessLogUpdate
-from schemas.short_link import ShortLinkCreate, ShortLinkUpdate
-from services.base import RepositoryDB
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from db.db import engine
+from models.general import (ShortLink as ShortLinkModel, AccessLog as AccessLogModel,
+                            LinkClickTotal, LinkClickHourly, UserAgent as UserAgentModel,
+                            Referer as RefererModel)
+from schemas.access_log import AccessLogCreate, AccessLogUpdate, AccessLogToDBBase
+from schemas.short_link import ShortLinkCreate, ShortLinkToDBBase, ShortLinkUpdate
+from services.base import RepositoryDB, set_params
+from services.cache import CachedLink, ShortLinkCache, build_link_cache
+from services.helpers import date_range_filters
 
 
 class RepositoryShortLink(RepositoryDB[ShortLinkModel, ShortLinkCreate, ShortLinkUpdate]):
-    pass
+    def __init__(self, model, cache: ShortLinkCache, primary: AsyncEngine):
+        super().__init__(model)
+        self._cache = cache
+        self._primary = primary
+
+    async def resolve(self, db: AsyncSession, short_url: str) -> Optional[CachedLink]:
+        """
+        Get the short link data needed for the redirect, from the cache if possible
+        """
+        cached_link = await self._cache.get(short_url)
+        if cached_link is not None:
+            return cached_link
+
+        return await self.load(db=db, short_url=short_url)
+
+    async def get_cached(self, short_url: str) -> Optional[CachedLink]:
+        return await self._cache.get(short_url)
+
+    async def load(
+            self, db: Union[AsyncSession, AsyncConnection], short_url: str
+    ) -> Optional[CachedLink]:
+        """
+        Get the short link data needed for the redirect from the database and cache it.
+        A plain connection may be given instead of the session, as no entity is built.
+        Only the links read from the primary are cached: a lagging replica could give
+        the link as it was before an invalidation.
+        """
+        version = await self._cache.version(short_url)
+        short_link = await self.get_fields(db=db, fields=CachedLink._fields, short_url=short_url)
+        if short_link is None:
+            return None
+
+        cached_link = CachedLink(*short_link)
+        bind = db.bind if isinstance(db, AsyncSession) else db
+        if bind.sync_engine is self._primary.sync_engine:
+            await self._cache.set(short_url, cached_link, version)
+        return cached_link
+
+    async def get_page(
+            self,
+            db: AsyncSession,
+            *,
+            fields: Sequence[str],
+            after_id: Optional[int] = None,
+            limit: Optional[int] = None,
+            filters: Sequence[ColumnElement[bool]] = (),
+            with_clicks: bool = False,
+            **kwargs
+    ) -> List[Row]:
+        """
+        A page of the links in the id order, as the rows of the given columns only.
+        With `with_clicks` the rows also have `clicks`, joined from the click totals
+        in the same query.
+        """
+        statement = select(*(getattr(self._model, field) for field in fields))
+
+        if with_clicks:
+            statement = statement.add_columns(
+                func.coalesce(LinkClickTotal.requests_count, 0).label('clicks')
+            ).outerjoin(LinkClickTotal, LinkClickTotal.short_link_id == self._model.id)
+
+        statement = set_params(statement.where(*filters), self._model, kwargs)
+
+        if after_id is not None:
+            statement = statement.where(self._model.id > after_id)
+
+        if limit:
+            statement = statement.limit(limit)
+
+        results = await db.execute(statement=statement.order_by(self._model.id))
+        return results.all()
+
+    async def get_or_create(
+            self, db: AsyncSession, *, obj_in: ShortLinkToDBBase
+    ) -> ShortLinkModel:
+        """
+        Get the active link of the same owner, type and `url_hash` or create it.
+        Of the concurrent creations only one gets through the unique hash index,
+        the others get its link.
+        """
+        statement = select(self._model).where(
+            self._model.url_hash == obj_in.url_hash,
+            self._model.link_type == obj_in.link_type,
+            self._model.is_active,
+            self._model.owner_id == obj_in.owner_id
+            if obj_in.owner_id is not None else self._model.owner_id.is_(None)
+        )
+
+        results = await db.execute(statement=statement)
+        db_obj = results.scalar_one_or_none()
+        if db_obj is not None:
+            return db_obj
+
+        results = await db.execute(
+            pg_insert(self._model).values(**obj_in.model_dump(exclude_unset=True))
+            .on_conflict_do_nothing()
+            .returning(self._model)
+        )
+        db_obj = results.scalar_one_or_none()
+        await db.commit()
+        if db_obj is not None:
+            return db_obj
+
+        results = await db.execute(statement=statement)
+        return results.scalar_one()
+
+    async def update(self, db: AsyncSession, *, db_obj: ShortLinkModel, obj_in) -> ShortLinkModel:
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        await self._cache.invalidate(db_obj.short_url)
+        return db_obj
+
+    async def soft_delete(self, db: AsyncSession, *, db_obj: ShortLinkModel) -> ShortLinkModel:
+        db_obj = await super().soft_delete(db, db_obj=db_obj)
+        await self._cache.invalidate(db_obj.short_url)
+        return db_obj
+
+
+class RepositoryClickCounter:
+    """
+    Per-link click totals and hourly click buckets.
+    They are incremented in the transaction that inserts the access logs.
+    """
+
+    async def increment(self, db: AsyncSession, clicks: Sequence[Row]) -> None:
+        """
+        Count the clicks given as (short_link_id, create_at) rows. Does not commit.
+        """
+        totals = Counter(short_link_id for short_link_id, _ in clicks)
+        buckets = Counter(
+            (short_link_id, create_at.replace(minute=0, second=0, microsecond=0))
+            for short_link_id, create_at in clicks
+        )
+
+        # The rows are upserted in the key order, so concurrent writers cannot deadlock
+        for model, values in (
+            (LinkClickTotal, [
+                {'short_link_id': short_link_id, 'requests_count': count}
+                for short_link_id, count in sorted(totals.items())
+            ]),
+            (LinkClickHourly, [
+                {'short_link_id': short_link_id, 'bucket': bucket, 'requests_count': count}
+                for (short_link_id, bucket), count in sorted(buckets.items())
+            ]),
+        ):
+            if not values:
+                continue
+            statement = pg_insert(model).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=model.__table__.primary_key.columns,
+                set_={'requests_count': model.requests_count + statement.excluded.requests_count}
+            )
+            await db.execute(statement)
+
+    async def get_total(self, db: AsyncSession, short_link_id: int) -> int:
+        statement = select(LinkClickTotal.requests_count).where(
+            LinkClickTotal.short_link_id == short_link_id
+        )
+        results = await db.execute(statement=statement)
+        return results.scalar_one_or_none() or 0
+
+    async def get_hourly(
+            self,
+            db: AsyncSession,
+            short_link_id: int,
+            date_from: Optional[datetime] = None,
+            date_to: Optional[datetime] = None,
+    ) -> List[LinkClickHourly]:
+        statement = select(LinkClickHourly).where(
+            LinkClickHourly.short_link_id == short_link_id,
+            *date_range_filters(LinkClickHourly.bucket, date_from, date_to)
+        )
+
+        results = await db.execute(statement=statement.order_by(LinkClickHourly.bucket))
+        return results.scalars().all()
+
+
+class RepositoryDictionary:
+    """
+    Deduplicated strings (user agents, referers) referenced by id from the access logs.
+    The known ids are kept in memory, so the repeated values cost no query.
+    """
+
+    def __init__(self, model, max_cached: int = 10000):
+        self._model = model
+        self._max_length = model.value.type.length
+        self._max_cached = max_cached
+        self._ids: Dict[str, int] = {}
+
+    async def get_ids(self, db: AsyncSession, values: Iterable[Optional[str]]) -> Dict[str, int]:
+        """
+        Get the ids of the values, inserting the new ones. Does not commit.
+        """
+        keys = {value: value[:self._max_length] for value in values if value}
+        ids = {key: self._ids[key] for key in keys.values() if key in self._ids}
+        missing = sorted(set(keys.values()) - ids.keys())
+
+        if missing:
+            await db.execute(
+                pg_insert(self._model).values([{'value': value} for value in missing])
+                .on_conflict_do_nothing()
+            )
+            results = await db.execute(
+                select(self._model.value, self._model.id).where(self._model.value.in_(missing))
+            )
+            fetched = dict(results.all())
+            ids.update(fetched)
+
+            if len(self._ids) + len(fetched) > self._max_cached:
+                self._ids.clear()
+            self._ids.update(fetched)
+
+        return {value: ids[key] for value, key in keys.items()}
+
+    def clear(self) -> None:
+        self._ids.clear()
 
 
 class RepositoryAccessLog(RepositoryDB[AccessLogModel, AccessLogCreate, AccessLogUpdate]):
-    pass
+    def __init__(
+            self,
+            model,
+            click_counter: RepositoryClickCounter,
+            user_agents: RepositoryDictionary,
+            referers: RepositoryDictionary,
+    ):
+        super().__init__(model)
+        self._click_counter = click_counter
+        self._user_agents = user_agents
+        self._referers = referers
+
+    async def insert_many(self, db: AsyncSession, *, objs_in: Sequence[AccessLogToDBBase]) -> None:
+        """
+        Insert the access logs and count them in the click rollups in one transaction
+        """
+        if not objs_in:
+            return
+
+        try:
+            user_agent_ids = await self._user_agents.get_ids(
+                db, (obj_in.user_agent for obj_in in objs_in)
+            )
+            referer_ids = await self._referers.get_ids(db, (obj_in.referer for obj_in in objs_in))
+
+            statement = insert(self._model).returning(
+                self._model.short_link_id, self._model.create_at
+            )
+            results = await db.execute(statement, [
+                {
+                    'short_link_id': obj_in.short_link_id,
+                    'client_ip': obj_in.client_ip,
+                    'user_agent_id': user_agent_ids.get(obj_in.user_agent),
+                    'referer_id': referer_ids.get(obj_in.referer),
+                    'extras': obj_in.extras,
+                }
+                for obj_in in objs_in
+            ])
+            await self._click_counter.increment(db, results.all())
+            await db.commit()
+        except Exception:
+            # The ids inserted by the failed transaction do not exist
+            self._user_agents.clear()
+            self._referers.clear()
+            raise
+
+    async def stream_rows(
+            self,
+            db: AsyncSession,
+            short_link_id: int,
+            after_id: Optional[int] = None,
+            filters: Sequence[ColumnElement[bool]] = (),
+            chunk_size: int = 1000,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Read the link's access logs by id through a server-side cursor, `chunk_size` rows
+        at a time, so any number of them is read in constant memory
+        """
+        statement = (
+            select(
+                self._model.id,
+                self._model.create_at,
+                self._model.client_ip,
+                UserAgentModel.value.label('user_agent'),
+                RefererModel.value.label('referer'),
+                self._model.extras,
+            )
+            .outerjoin(UserAgentModel, self._model.user_agent_id == UserAgentModel.id)
+            .outerjoin(RefererModel, self._model.referer_id == RefererModel.id)
+            .where(self._model.short_link_id == short_link_id, *filters)
+            .order_by(self._model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+
+        if after_id is not None:
+            statement = statement.where(self._model.id > after_id)
+
+        results = await db.stream(statement)
+        async for rows in results.partitions():
+            yield rows
+
 
+link_cache = build_link_cache()
 
-short_link_crud = RepositoryShortLink(ShortLinkModel)
-access_log_crud = RepositoryAccessLog(AccessLogModel)
+short_link_crud = RepositoryShortLink(ShortLinkModel, cache=link_cache, primary=engine)
+click_counter_crud = RepositoryClickCounter()
+access_log_crud = RepositoryAccessLog(
+    AccessLogModel,
+    click_counter=click_counter_crud,
+    user_agents=RepositoryDictionary(UserAgentModel),
+    referers=RepositoryDictionary(RefererModel),
+)
@@ -1,20 +1,35 @@
 # https://fastapi-users.github.io/fastapi-users/10.4/configuration/databases/sqlalchemy/
 
 import uuid
+from typing import Any, Dict, Optional
 
-from fastapi import Depends
+import jwt
+from fastapi import Depends, Request
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
 from fastapi_users.authentication import AuthenticationBackend, BearerTransport, JWTStrategy
+from fastapi_users.jwt import decode_jwt
+from sqlalchemy import select
 
 from core.config import app_settings
+from db.db import engine
 from models.general import User, get_user_db
+from services.principal import Principal, principal_cache
 
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = app_settings.secret
     verification_token_secret = app_settings.secret
 
+    async def on_after_update(
+            self, user: User, update_dict: Dict[str, Any], request: Optional[Request] = None
+    ) -> None:
+        if 'is_active' in update_dict:
+            await principal_cache.invalidate_user(user.id)
+
+    async def on_after_delete(self, user: User, request: Optional[Request] = None) -> None:
+        await principal_cache.invalidate_user(user.id)
+
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
     yield UserManager(user_db)
@@ -35,3 +50,54 @@ auth_backend = AuthenticationBackend(
 
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
 current_active_user = fastapi_users.current_user(optional=True)
+
+
+async def principal_from_token(token: Optional[str]) -> Optional[Principal]:
+    """
+    The principal of the active user of the token. The verified tokens are cached,
+    so only the first request with a token decodes it and reads the user.
+    """
+    if token is None:
+        return None
+
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    generation = principal_cache.generation
+    strategy = get_jwt_strategy()
+    try:
+        data = decode_jwt(
+            token, strategy.decode_key, strategy.token_audience, algorithms=[strategy.algorithm]
+        )
+        user_id = uuid.UUID(data['sub'])
+    except (jwt.PyJWTError, KeyError, ValueError):
+        return None
+
+    # The primary is read, as a replica may not have the deactivation yet
+    async with engine.connect() as connection:
+        results = await connection.execute(
+            select(User.id, User.is_active).where(User.id == user_id)
+        )
+        row = results.one_or_none()
+
+    if row is None or not row.is_active:
+        return None
+
+    principal = Principal(*row)
+    principal_cache.set(token, principal, data.get('exp'), generation)
+    return principal
+
+
+async def current_principal(
+        token: Optional[str] = Depends(bearer_transport.scheme)
+) -> Optional[Principal]:
+    return await principal_from_token(token)
+
+
+async def resolve_principal(request: Request) -> Optional[Principal]:
+    """
+    The principal of the request's bearer token, for the endpoints
+    that need the user only in some cases and so do not depend on `current_principal`
+    """
+    return await principal_from_token(await bearer_transport.scheme(request))
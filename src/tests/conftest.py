@@ -5,12 +5,14 @@ from alembic.config import Config
 from alembic.command import upgrade, downgrade
 
 from db.db import engine
+from services.access_log_writer import access_log_writer
 
 
 @pytest.fixture(scope='session')
 def event_loop():
     loop = asyncio.get_event_loop_policy().new_event_loop()
     yield loop
+    loop.run_until_complete(access_log_writer.stop())
     loop.close()
 
 
@@ -0,0 +1,61 @@
+import asyncio
+from typing import Dict, List, Optional
+
+
+class FakePubSub:
+    def __init__(self, redis: 'FakeRedis'):
+        self._redis = redis
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._channels: List[str] = []
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self._channels.append(channel)
+            self._redis.subscribers.setdefault(channel, []).append(self._queue)
+            await self._queue.put({'type': 'subscribe', 'channel': channel, 'data': 1})
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+    async def close(self):
+        for channel in self._channels:
+            self._redis.subscribers[channel].remove(self._queue)
+        self._channels = []
+
+
+class FakeRedis:
+    """
+    Local stand-in for the part of redis.asyncio.Redis used by the shared cache.
+    One instance plays the Redis server shared by several workers.
+    """
+
+    def __init__(self):
+        self.data: Dict[str, bytes] = {}
+        self.subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None):
+        self.data[key] = value
+
+    async def incr(self, key: str) -> int:
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return key in self.data
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def publish(self, channel: str, message: str) -> int:
+        queues = self.subscribers.get(channel, [])
+        for queue in queues:
+            await queue.put({'type': 'message', 'channel': channel, 'data': message.encode()})
+        return len(queues)
+
+    def pubsub(self) -> FakePubSub:
+        return FakePubSub(self)
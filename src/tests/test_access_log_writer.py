@@ -0,0 +1,72 @@
+import json
+
+from fastapi import Request
+from httpx import AsyncClient
+
+from core.config import app_settings
+from db.db import async_session_maker
+from main import app
+from models.general import UserAgent
+from schemas.access_log import AccessLogToDBBase
+from schemas.short_link import ShortLinkSchemaCreate
+from services.access_log_writer import AccessLogWriter
+from services.helpers import access_log_from_request
+from services.shortlink import RepositoryDictionary, access_log_crud
+
+
+async def test_writer_flushes_batches(event_loop):
+    link = {'original-url': 'http://www.postgresql.org'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(app.url_path_for('create_short_link'), json=link)
+    short_link = ShortLinkSchemaCreate.model_validate(json.loads(response.content.decode()))
+
+    writer = AccessLogWriter(
+        session_maker=async_session_maker, batch_size=2, flush_interval=60, max_queue_size=10
+    )
+    for _ in range(5):
+        await writer.submit(AccessLogToDBBase(user_agent='test', short_link_id=short_link.id))
+    await writer.stop()
+
+    assert writer.stats() == {'queue_size': 0, 'written': 5, 'dropped': 0, 'failed': 0}
+    async with async_session_maker() as db:
+        assert await access_log_crud.count(db=db, short_link_id=short_link.id) == 5
+
+
+async def test_writer_drops_logs_when_queue_is_full(event_loop):
+    writer = AccessLogWriter(
+        session_maker=async_session_maker, batch_size=10, flush_interval=60, max_queue_size=1
+    )
+    for _ in range(3):
+        await writer.submit(AccessLogToDBBase(user_agent='test', short_link_id=0))
+    await writer.stop()
+
+    assert writer.dropped == 2
+    assert writer.failed == 1
+
+
+async def test_dictionary_cache_overflow(event_loop):
+    user_agents = RepositoryDictionary(UserAgent, max_cached=3)
+    async with async_session_maker() as db:
+        first = await user_agents.get_ids(db, ['overflow/1', 'overflow/2'])
+
+        # Two known values and two new ones overflow the cache of three
+        ids = await user_agents.get_ids(
+            db, ['overflow/1', 'overflow/2', 'overflow/3', 'overflow/4', None]
+        )
+        await db.commit()
+
+    assert len(set(ids.values())) == 4
+    assert {value: ids[value] for value in first} == first
+
+
+def test_access_log_of_proxied_request(monkeypatch):
+    monkeypatch.setattr(app_settings, 'trust_forwarded_headers', True)
+    request = Request({
+        'type': 'http',
+        'client': ('172.18.0.5', 40000),
+        'headers': [(b'x-forwarded-for', b'198.51.100.7, 203.0.113.1'), (b'user-agent', b'test')],
+    })
+
+    access_log = access_log_from_request(request, short_link_id=1)
+    assert access_log.client_ip == '203.0.113.1'
+    assert access_log.user_agent == 'test'
@@ -0,0 +1,96 @@
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from db.db import engine
+from main import app
+from models.general import ShortLink, User
+from services.authorization import Action, is_allowed
+from services.cache import CachedLink
+from services.principal import Principal
+
+
+def test_rules():
+    owner, stranger = Principal(uuid.uuid4(), True), Principal(uuid.uuid4(), True)
+    private = CachedLink(1, 'http://example.com', 'private', owner.id, True)
+    public = CachedLink(2, 'http://example.com', 'public', owner.id, True)
+    anonymous = CachedLink(3, 'http://example.com', 'public', None, True)
+
+    assert is_allowed(owner, private, Action.READ)
+    assert not is_allowed(stranger, private, Action.READ)
+    assert not is_allowed(None, private, Action.READ)
+    assert is_allowed(None, public, Action.READ)
+    assert not is_allowed(stranger, public, Action.DELETE)
+    assert is_allowed(None, anonymous, Action.DELETE)
+    assert is_allowed(owner, public, Action.CHANGE)
+    assert not is_allowed(None, anonymous, Action.CHANGE)
+
+
+@contextmanager
+def count_queries() -> Iterator[Dict[str, List]]:
+    counts = {'statements': [], 'loaded': []}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counts['statements'].append(statement)
+
+    def on_load(target, context):
+        counts['loaded'].append(type(target).__name__)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(ShortLink, 'load', on_load)
+    event.listen(User, 'load', on_load)
+    try:
+        yield counts
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(ShortLink, 'load', on_load)
+        event.remove(User, 'load', on_load)
+
+
+async def test_owner_checks_load_no_users(event_loop):
+    user_data = {'username': 'lisa@simpson.com', 'password': 'springfield'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        await ac.post(
+            app.url_path_for('register:register'),
+            json={'email': user_data['username'], 'password': user_data['password']}
+        )
+        response = await ac.post(app.url_path_for('auth:jwt.login'), data=user_data)
+        headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+        response = await ac.post(
+            app.url_path_for('create_short_link'),
+            json={'original-url': 'http://owned.example.com', 'link_type': 'private'},
+            headers=headers
+        )
+        short_url = response.json()['short-url'].split('/')[-1]
+
+        with count_queries() as counts:
+            response = await ac.put(
+                f'/{short_url}', json={'link_type': 'public'}, headers=headers
+            )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert len(counts['statements']) == 2
+        assert counts['loaded'] == ['ShortLink']
+
+        with count_queries() as counts:
+            response = await ac.get(app.url_path_for('user_status'), headers=headers)
+        assert [link['short-url'].split('/')[-1] for link in response.json()] == [short_url]
+        assert len(counts['statements']) == 1
+        assert counts['loaded'] == []
+
+        with count_queries() as counts:
+            response = await ac.delete(f'/{short_url}')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert len(counts['statements']) == 1
+        assert counts['loaded'] == []
+
+        with count_queries() as counts:
+            response = await ac.delete(f'/{short_url}', headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(counts['statements']) == 2
+        assert counts['loaded'] == []
+        assert not any('"user"' in statement for statement in counts['statements'])
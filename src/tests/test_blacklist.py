@@ -0,0 +1,48 @@
+import os
+
+from sqlalchemy import delete, insert
+
+from db.db import async_session_maker, engine
+from models.general import BlacklistRule
+from services.blacklist import IPBlacklist
+
+
+def test_most_specific_network_is_hit():
+    blacklist = IPBlacklist(entries=[
+        '10.0.0.0/8', '10.1.0.0/16', '10.1.2.3', '10.2.0.0/16', '2001:db8::/32', 'invalid'
+    ])
+
+    assert str(blacklist.match('10.1.2.3')) == '10.1.2.3/32'
+    assert str(blacklist.match('10.1.2.4')) == '10.1.0.0/16'
+    assert str(blacklist.match('10.3.0.1')) == '10.0.0.0/8'
+    assert str(blacklist.match('10.255.255.255')) == '10.0.0.0/8'
+    assert str(blacklist.match('::ffff:10.2.0.1')) == '10.2.0.0/16'
+    assert str(blacklist.match('2001:db8::1')) == '2001:db8::/32'
+    assert blacklist.match('11.0.0.0') is None
+    assert blacklist.match('9.255.255.255') is None
+    assert blacklist.match('testclient') is None
+    assert blacklist.stats()['hits']['10.0.0.0/8'] == 2
+
+
+async def test_reload_from_file_and_table(tmp_path, event_loop):
+    path = tmp_path / 'black_list.txt'
+    path.write_text('192.0.2.0/24  # documentation\n\n')
+    blacklist = IPBlacklist(file_path=str(path), engine=engine)
+
+    async with async_session_maker() as db:
+        await db.execute(insert(BlacklistRule).values(network='198.51.100.0/24'))
+        await db.commit()
+    try:
+        await blacklist.reload()
+        assert blacklist.match('192.0.2.1') is not None
+        assert blacklist.match('198.51.100.1') is not None
+
+        path.write_text('203.0.113.0/24\n')
+        os.utime(path, (0, 0))
+        await blacklist.reload()
+        assert blacklist.match('192.0.2.1') is None
+        assert blacklist.match('203.0.113.1') is not None
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(BlacklistRule))
+            await db.commit()
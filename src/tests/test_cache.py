@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+from fastapi import status
+from httpx import AsyncClient
+from redis.exceptions import ConnectionError
+
+from main import app
+from schemas.short_link import ShortLinkSchemaCreate
+from tests.fake_redis import FakeRedis
+from services.cache import (CachedLink, LinkCache, MemoryCacheBackend, RedisCacheBackend,
+                            RedisInvalidationBus, ShortLinkCache)
+from services.shortlink import link_cache
+
+
+def make_link(link_id: int) -> CachedLink:
+    return CachedLink(
+        id=link_id,
+        original_url='http://www.ya.ru',
+        link_type='public',
+        owner_id=None,
+        is_active=True
+    )
+
+
+def test_cache_lru_eviction():
+    cache = LinkCache(max_size=2, ttl=60)
+    cache.set('a', make_link(1))
+    cache.set('b', make_link(2))
+    assert cache.get('a').id == 1
+
+    cache.set('c', make_link(3))
+
+    assert cache.get('b') is None
+    assert cache.get('a').id == 1
+    assert cache.get('c').id == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cache_ttl_expiration(mocker):
+    monotonic = mocker.patch('services.cache.time.monotonic', return_value=100)
+    cache = LinkCache(max_size=2, ttl=60)
+    cache.set('a', make_link(1))
+    assert cache.get('a').id == 1
+
+    monotonic.return_value = 161
+    assert cache.get('a') is None
+    assert cache.stats() == {
+        'size': 0, 'max_size': 2, 'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 1,
+    }
+
+
+async def test_redirect_cache_invalidation(event_loop):
+    link = {'original-url': 'http://www.python.org'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(app.url_path_for('create_short_link'), json=link)
+        data = ShortLinkSchemaCreate.model_validate(json.loads(response.content.decode()))
+        short_url = data.short_url.split('/')[-1]
+
+        hits = link_cache.local.stats()['hits']
+        response = await ac.get(f'/{short_url}')
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        response = await ac.get(f'/{short_url}')
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert link_cache.local.stats()['hits'] == hits + 1
+
+        response = await ac.delete(f'/{short_url}')
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await ac.get(f'/{short_url}')
+        assert response.status_code == status.HTTP_410_GONE
+
+
+def make_worker_cache(redis: FakeRedis) -> ShortLinkCache:
+    return ShortLinkCache(
+        local=MemoryCacheBackend(max_size=10, ttl=60),
+        shared=RedisCacheBackend(redis, ttl=60),
+        bus=RedisInvalidationBus(redis, channel='invalidation'),
+    )
+
+
+async def test_shared_cache_invalidation_broadcast(event_loop):
+    redis = FakeRedis()
+    first_worker, second_worker = make_worker_cache(redis), make_worker_cache(redis)
+    await first_worker.start()
+    await second_worker.start()
+    await asyncio.sleep(0)
+
+    await first_worker.set('a', make_link(1), await first_worker.version('a'))
+    assert (await second_worker.get('a')).id == 1
+    assert second_worker.stats()['shared']['hits'] == 1
+
+    await first_worker.invalidate('a')
+    await asyncio.sleep(0)
+
+    assert await second_worker.local.get('a') is None
+    assert await second_worker.get('a') is None
+
+    await first_worker.stop()
+    await second_worker.stop()
+
+
+async def test_stale_fill_after_invalidation(event_loop):
+    redis = FakeRedis()
+    first_worker, second_worker = make_worker_cache(redis), make_worker_cache(redis)
+
+    # Read before the change is committed and invalidated by the other worker
+    version = await second_worker.version('a')
+    await first_worker.invalidate('a')
+    await second_worker.set('a', make_link(1), version)
+
+    assert await second_worker.local.get('a') is None
+    assert await second_worker.shared.get('a') is None
+
+    version = await second_worker.version('a')
+    await second_worker.set('a', make_link(1), version)
+    assert (await first_worker.get('a')).id == 1
+
+    local_only = ShortLinkCache(local=MemoryCacheBackend(max_size=10, ttl=60))
+    version = await local_only.version('a')
+    await local_only.invalidate('a')
+    await local_only.set('a', make_link(1), version)
+    assert await local_only.get('a') is None
+
+
+class BrokenRedis(FakeRedis):
+    async def incr(self, key: str) -> int:
+        raise ConnectionError('Connection refused')
+
+    async def publish(self, channel: str, message: str) -> int:
+        raise ConnectionError('Connection refused')
+
+
+async def test_invalidation_survives_redis_errors(event_loop):
+    cache = make_worker_cache(BrokenRedis())
+    await cache.local.set('a', make_link(1))
+
+    await cache.invalidate('a')
+
+    assert await cache.local.get('a') is None
+    assert cache.stats()['shared']['errors'] == 1
@@ -2,8 +2,10 @@ import json
 from fastapi import status
 from httpx import AsyncClient
 
+from db.db import engine
 from main import app
 from schemas.short_link import ShortLinkSchemaCreate
+from services.access_log_writer import access_log_writer
 
 
 async def test_access_from_forbidden_ip(mocker, event_loop):
@@ -22,6 +24,15 @@ async def test_access_from_allowed_ip(mocker, event_loop):
         assert response.status_code == status.HTTP_200_OK
 
 
+async def test_ping_detailed(event_loop):
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.get(app.url_path_for('ping_db'), params={'detailed': True})
+        data = response.json()
+        assert data['Connected']
+        assert data['pool']['checked_out'] >= 1
+        assert data['pool']['checkouts'] >= 1
+
+
 async def test_create_user(event_loop):
     user_data = {
         'email': 'homer@simpson.com',
@@ -38,7 +49,7 @@ async def test_create_and_delete_shortlink(event_loop):
         response = await ac.post(app.url_path_for('create_short_link'), json=link)
         assert response.status_code == status.HTTP_201_CREATED
 
-        data = ShortLinkSchemaCreate.parse_obj(json.loads(response.content.decode()))
+        data = ShortLinkSchemaCreate.model_validate(json.loads(response.content.decode()))
         short_url = data.short_url.split('/')[-1]
 
         response = await ac.get(f'/{short_url}')
@@ -49,3 +60,202 @@ async def test_create_and_delete_shortlink(event_loop):
 
         response = await ac.get(f'/{short_url}')
         assert response.status_code == status.HTTP_410_GONE
+
+
+async def test_link_statistic_pagination(event_loop):
+    link = {'original-url': 'http://www.fastapi.tiangolo.com'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(app.url_path_for('create_short_link'), json=link)
+        data = ShortLinkSchemaCreate.model_validate(json.loads(response.content.decode()))
+        short_url = data.short_url.split('/')[-1]
+
+        for _ in range(3):
+            await ac.get(f'/{short_url}')
+        await access_log_writer.join()
+
+        response = await ac.get(f'/{short_url}/status', params={'full_info': '', 'max-result': 2})
+        assert response.status_code == status.HTTP_200_OK
+        first_page = response.json()
+        assert first_page['requests_count'] == 3
+        assert len(first_page['logs']) == 2
+        assert json.loads(first_page['logs'][0]['connection_info'])['user-agent'].startswith(
+            'python-httpx'
+        )
+
+        response = await ac.get(
+            f'/{short_url}/status',
+            params={'full_info': '', 'max-result': 2, 'cursor': first_page['next_cursor']}
+        )
+        second_page = response.json()
+        assert len(second_page['logs']) == 1
+        assert second_page['next_cursor'] is None
+
+        response = await ac.get(f'/{short_url}/timeseries')
+        assert response.status_code == status.HTTP_200_OK
+        assert sum(bucket['requests_count'] for bucket in response.json()) == 3
+
+
+async def test_create_short_links_batch(event_loop):
+    links = [
+        {'original-url': 'http://batch.example.com/1'},
+        {'original-url': 'not an url'},
+        {'original-url': 'http://batch.example.com/1'},
+        {'original-url': 'http://batch.example.com/2'},
+    ]
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(app.url_path_for('create_short_links_batch'), json=links)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        first, invalid, duplicate, second = response.json()
+        assert first == duplicate
+        assert first['short-id'] != second['short-id']
+        assert set(invalid) == {'original-url', 'error'}
+
+        response = await ac.get(f"/{second['short-url'].split('/')[-1]}")
+        assert response.headers['location'] == 'http://batch.example.com/2'
+
+
+async def test_create_short_links_ndjson(event_loop, mocker):
+    mocker.patch('api.shorten_url.app_settings.short_link_batch_chunk_size', 2)
+    lines = [
+        json.dumps({'original-url': 'http://ndjson.example.com/1'}),
+        '{"original-url":',
+        json.dumps({'original-url': 'http://ndjson.example.com/1'}),
+        json.dumps({'original-url': 'http://ndjson.example.com/' + 'x' * 5000}),
+        json.dumps({'original-url': 'http://ndjson.example.com/2'}),
+    ]
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(
+            app.url_path_for('create_short_links_batch'),
+            content='\n'.join(lines),
+            headers={'content-type': 'application/x-ndjson'}
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.headers['content-type'] == 'application/x-ndjson'
+
+        first, invalid, duplicate, too_long, second = map(json.loads, response.text.splitlines())
+        assert first == duplicate
+        assert 'error' in invalid
+        assert 'error' in too_long
+        assert first['short-id'] != second['short-id']
+
+    assert engine.pool.checkedout() == 0
+
+
+async def test_export_link_statistic(event_loop):
+    link = {'original-url': 'http://export.example.com'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(app.url_path_for('create_short_link'), json=link)
+        short_url = response.json()['short-url'].split('/')[-1]
+
+        for _ in range(3):
+            await ac.get(f'/{short_url}', headers={'user-agent': 'export-test'})
+        await access_log_writer.join()
+
+        response = await ac.get(f'/{short_url}/export')
+        assert response.headers['content-type'] == 'application/x-ndjson'
+        logs = [json.loads(line) for line in response.text.splitlines()]
+        assert len(logs) == 3
+        assert logs[0]['user_agent'] == 'export-test'
+
+        response = await ac.get(
+            f'/{short_url}/export', params={'format': 'csv', 'after_id': logs[0]['id']}
+        )
+        assert response.headers['content-type'].startswith('text/csv')
+        header, *rows = response.text.splitlines()
+        assert header == 'id,create_at,client_ip,user_agent,referer,extras'
+        assert [row.split(',')[0] for row in rows] == [str(log['id']) for log in logs[1:]]
+
+    # The streamed export releases its connection
+    assert engine.pool.checkedout() == 0
+
+
+async def test_create_shortlink_dedup(event_loop):
+    url = app.url_path_for('create_short_link')
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        first = await ac.post(
+            url, params={'dedup': True}, json={'original-url': 'http://Dedup.RU'}
+        )
+        second = await ac.post(
+            url, params={'dedup': True}, json={'original-url': 'http://dedup.ru:80/'}
+        )
+        assert first.json() == second.json()
+
+        response = await ac.post(url, json={'original-url': 'http://dedup.ru'})
+        assert response.json() != first.json()
+
+        await ac.delete(f"/{first.json()['short-url'].split('/')[-1]}")
+        response = await ac.post(
+            url, params={'dedup': True}, json={'original-url': 'http://DEDUP.ru/'}
+        )
+        assert response.json() != first.json()
+
+
+async def test_redirect_to_private_link(event_loop):
+    user_data = {'username': 'marge@simpson.com', 'password': 'springfield'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        await ac.post(
+            app.url_path_for('register:register'),
+            json={'email': user_data['username'], 'password': user_data['password']}
+        )
+        response = await ac.post(app.url_path_for('auth:jwt.login'), data=user_data)
+        headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+        response = await ac.post(
+            app.url_path_for('create_short_link'),
+            json={'original-url': 'http://private.example.com', 'link_type': 'private'},
+            headers=headers
+        )
+        short_url = response.json()['short-url'].split('/')[-1]
+
+        response = await ac.get(f'/{short_url}')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        response = await ac.get(f'/{short_url}', headers=headers)
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert response.headers['location'] == 'http://private.example.com'
+
+
+async def test_user_status_pages(event_loop):
+    user_data = {'username': 'maggie@simpson.com', 'password': 'springfield'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        await ac.post(
+            app.url_path_for('register:register'),
+            json={'email': user_data['username'], 'password': user_data['password']}
+        )
+        response = await ac.post(app.url_path_for('auth:jwt.login'), data=user_data)
+        headers = {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+        short_urls = []
+        for number, link_type in enumerate(('public', 'private', 'public')):
+            response = await ac.post(
+                app.url_path_for('create_short_link'),
+                json={'original-url': f'http://pages.example.com/{number}',
+                      'link_type': link_type},
+                headers=headers
+            )
+            short_urls.append(response.json()['short-url'].split('/')[-1])
+
+        await ac.get(f'/{short_urls[0]}')
+        await ac.get(f'/{short_urls[0]}')
+        await access_log_writer.join()
+
+        url = app.url_path_for('user_status')
+        response = await ac.get(url, params={'max-result': 2, 'clicks': True}, headers=headers)
+        first_page = response.json()
+        assert [link['clicks'] for link in first_page] == [2, 0]
+        assert set(first_page[0]) == {'short-id', 'short-url', 'original-url', 'type', 'clicks'}
+
+        response = await ac.get(
+            url,
+            params={'max-result': 2, 'cursor': response.headers['X-Next-Cursor']},
+            headers=headers
+        )
+        second_page = response.json()
+        assert 'X-Next-Cursor' not in response.headers
+        assert 'clicks' not in second_page[0]
+        links = first_page + second_page
+        assert [link['short-url'].split('/')[-1] for link in links] == short_urls
+
+        response = await ac.get(url, params={'type': 'private'}, headers=headers)
+        assert [link['type'] for link in response.json()] == ['private']
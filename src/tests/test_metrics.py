@@ -0,0 +1,45 @@
+from collections import Counter
+
+from httpx import AsyncClient
+
+from db.db import engine
+from main import app
+from services.access_log_writer import access_log_writer
+from services.cache import MemoryCacheBackend, RedisCacheBackend, ShortLinkCache
+from services.metrics import ServiceCollector, registry
+from tests.fake_redis import FakeRedis
+
+
+async def test_metrics_are_labelled_by_route_template(event_loop):
+    not_found = {'method': 'GET', 'route': '/{short_url}', 'status': '404'}
+    not_found_before = registry.get_sample_value('http_responses_total', not_found) or 0
+
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.post(
+            app.url_path_for('create_short_link'), json={'original-url': 'http://metrics.ru'}
+        )
+        short_url = response.json()['short-url'].split('/')[-1]
+        await ac.get(f'/{short_url}')
+        await ac.get('/unknown-short-url')
+
+        response = await ac.get(app.url_path_for('metrics'))
+
+    metrics = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/{short_url}"}' in metrics
+    assert registry.get_sample_value('http_responses_total', not_found) == not_found_before + 1
+    assert 'http_request_db_queries_count{route="/"}' in metrics
+    assert short_url not in metrics
+    assert 'link_cache_hit_ratio{level="local"}' in metrics
+    assert 'access_log_queue_size' in metrics
+
+
+def test_cache_levels_share_metric_families():
+    link_cache = ShortLinkCache(
+        local=MemoryCacheBackend(max_size=10, ttl=60),
+        shared=RedisCacheBackend(FakeRedis(), ttl=60),
+    )
+    metrics = list(ServiceCollector(link_cache, access_log_writer, engine).collect())
+
+    assert max(Counter(metric.name for metric in metrics).values()) == 1
+    hit_ratio = next(metric for metric in metrics if metric.name == 'link_cache_hit_ratio')
+    assert [sample.labels['level'] for sample in hit_ratio.samples] == ['local', 'shared']
@@ -0,0 +1,63 @@
+import gzip
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from db.db import engine
+from services.partitions import AccessLogPartitionManager, partition_name
+
+
+async def test_partitions_created_and_expired(event_loop, tmp_path):
+    manager = AccessLogPartitionManager(
+        engine=engine, months_ahead=2, retention_months=1, archive_dir=str(tmp_path)
+    )
+    async with engine.connect() as connection:
+        await manager.create_partition(connection, date(2001, 1, 1))
+        await connection.execute(text(
+            'INSERT INTO short_link (short_url, original_url) '
+            "VALUES ('partition', 'http://old.ru')"
+        ))
+        await connection.execute(text(
+            'INSERT INTO access_log (short_link_id, create_at) '
+            "SELECT id, '2001-01-15' FROM short_link WHERE short_url = 'partition'"
+        ))
+        await connection.commit()
+
+    # Only the test's January 2001 partition is older than the retention period
+    await manager.maintain(today=date(2001, 3, 20))
+
+    async with engine.connect() as connection:
+        partitions = await manager.get_partitions(connection)
+        for month in (date(2001, 3, 1), date(2001, 4, 1), date(2001, 5, 1)):
+            assert partition_name(month) in partitions
+        assert partition_name(date(2001, 1, 1)) not in partitions
+        assert partition_name(date.today().replace(day=1)) in partitions
+
+        await connection.execute(text("DELETE FROM short_link WHERE short_url = 'partition'"))
+        for month in (date(2001, 3, 1), date(2001, 4, 1), date(2001, 5, 1)):
+            await connection.execute(text(f'DROP TABLE {partition_name(month)}'))
+        await connection.commit()
+
+    with gzip.open(tmp_path / 'access_log_p200101.csv.gz', 'rt') as archive:
+        rows = archive.read().splitlines()
+    assert len(rows) == 2
+    assert rows[1].endswith('2001-01-15 00:00:00')
+
+
+async def test_failed_archive_keeps_partition(event_loop, tmp_path, mocker):
+    manager = AccessLogPartitionManager(
+        engine=engine, months_ahead=0, retention_months=1, archive_dir=str(tmp_path)
+    )
+    mocker.patch.object(manager, 'archive', side_effect=OSError('No space left on device'))
+    async with engine.connect() as connection:
+        await manager.create_partition(connection, date(2001, 1, 1))
+
+    with pytest.raises(OSError):
+        await manager.maintain(today=date(2001, 3, 20))
+
+    async with engine.connect() as connection:
+        assert partition_name(date(2001, 1, 1)) in await manager.get_partitions(connection)
+        await connection.execute(text(f'DROP TABLE {partition_name(date(2001, 3, 1))}'))
+        await connection.execute(text(f'DROP TABLE {partition_name(date(2001, 1, 1))}'))
+        await connection.commit()
@@ -0,0 +1,69 @@
+import time
+import uuid
+
+from fastapi import status
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from db.db import async_session_maker, engine
+from main import app
+from models.general import User
+from schemas.users import UserUpdate
+from services.principal import Principal, PrincipalCache, principal_cache
+from services.users import UserManager
+
+
+def test_entries_expire_with_token():
+    cache = PrincipalCache(max_size=2, ttl=60)
+    principal = Principal(uuid.uuid4(), True)
+
+    cache.set('expired', principal, time.time() - 1, cache.generation)
+    cache.set('valid', principal, time.time() + 3600, cache.generation)
+    assert cache.get('expired') is None
+    assert cache.get('valid') == principal
+
+    # Verified before the invalidation of the user, so it is not cached
+    generation = cache.generation
+    cache._drop_local(str(principal.id))
+    assert cache.get('valid') is None
+    cache.set('valid', principal, None, generation)
+    assert cache.get('valid') is None
+
+
+async def test_token_is_verified_once_and_invalidated_on_deactivation(event_loop):
+    user_data = {'username': 'bart@simpson.com', 'password': 'springfield'}
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        await ac.post(
+            app.url_path_for('register:register'),
+            json={'email': user_data['username'], 'password': user_data['password']}
+        )
+        response = await ac.post(app.url_path_for('auth:jwt.login'), data=user_data)
+        token = response.json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            for _ in range(3):
+                response = await ac.get(app.url_path_for('user_status'), headers=headers)
+                assert response.status_code == status.HTTP_200_OK
+        finally:
+            event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+        user_reads = [statement for statement in statements if 'FROM "user"' in statement]
+        assert len(user_reads) == 1
+        assert 'short_link' not in user_reads[0]
+
+        async with async_session_maker() as session:
+            user_manager = UserManager(SQLAlchemyUserDatabase(session, User))
+            user = await user_manager.get_by_email(user_data['username'])
+            await user_manager.update(UserUpdate(is_active=False), user)
+
+        assert principal_cache.get(token) is None
+        response = await ac.get(app.url_path_for('user_status'), headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,32 @@
+from collections import namedtuple
+
+from core.public_url import forwarded_base_url, public_base_url
+from schemas.short_link import ShortLinkSchemaStatus, short_link_status_items
+
+StatusRow = namedtuple('StatusRow', ('id', 'short_url', 'original_url', 'link_type', 'clicks'))
+
+
+def test_forwarded_base_url():
+    assert forwarded_base_url('http', {
+        'host': 'internal:8000', 'x-forwarded-proto': 'https, http'
+    }) == 'https://internal:8000'
+    assert forwarded_base_url('http', {
+        'host': 'internal:8000', 'x-forwarded-host': 'sho.rt'
+    }) == 'http://sho.rt'
+    assert forwarded_base_url('http', {}) == public_base_url.get()
+
+
+def test_status_items_match_schema():
+    rows = [StatusRow(1, 'abc', 'http://example.com/', 'public', 3)]
+    token = public_base_url.set('https://sho.rt')
+    try:
+        expected = [
+            ShortLinkSchemaStatus.model_validate(row).model_dump(by_alias=True, exclude_none=True)
+            for row in rows
+        ]
+        assert short_link_status_items(rows, with_clicks=True) == expected
+        assert short_link_status_items([row[:4] for row in rows], with_clicks=False) == [
+            {key: value for key, value in expected[0].items() if key != 'clicks'}
+        ]
+    finally:
+        public_base_url.reset(token)
@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import joinedload
+
+from db.db import async_session_maker, engine
+from models.general import AccessLog
+from services.shortlink import access_log_crud, click_counter_crud, short_link_crud
+
+USERS = 100
+LINKS = 20000
+ACCESS_LOGS = 200000
+
+SEED_SQL = (
+    f"""
+    INSERT INTO "user" (id, email, hashed_password, is_active, is_superuser, is_verified)
+    SELECT gen_random_uuid(), 'plan-' || i || '@example.com', '', true, false, false
+    FROM generate_series(1, {USERS}) AS i
+    """,
+    f"""
+    INSERT INTO short_link (short_url, original_url, link_type, owner_id, is_active)
+    SELECT 'plan-' || i, 'http://plan.example.com/' || i, 'public',
+           (SELECT id FROM "user" WHERE email = 'plan-' || (i % {USERS} + 1) || '@example.com'),
+           i % 10 <> 0
+    FROM generate_series(1, {LINKS}) AS i
+    """,
+    f"""
+    INSERT INTO access_log (short_link_id, client_ip, create_at)
+    SELECT (SELECT min(id) FROM short_link WHERE short_url LIKE 'plan-%') + i % {LINKS},
+           '10.0.0.1', now() - i * interval '1 second'
+    FROM generate_series(1, {ACCESS_LOGS}) AS i
+    """,
+    'ANALYZE "user", short_link, access_log',
+)
+
+CLEANUP_SQL = (
+    "DELETE FROM access_log WHERE short_link_id IN "
+    "(SELECT id FROM short_link WHERE short_url LIKE 'plan-%')",
+    "DELETE FROM short_link WHERE short_url LIKE 'plan-%'",
+    "DELETE FROM \"user\" WHERE email LIKE 'plan-%'",
+)
+
+
+@pytest.fixture(scope='module')
+async def seeded_db(event_loop):
+    async with engine.begin() as connection:
+        for statement in SEED_SQL:
+            await connection.execute(text(statement))
+
+    async with async_session_maker() as db:
+        row = (await db.execute(text(
+            "SELECT id, owner_id FROM short_link WHERE short_url = 'plan-42'"
+        ))).one()
+        yield db, row.id, row.owner_id
+
+    async with engine.begin() as connection:
+        for statement in CLEANUP_SQL:
+            await connection.execute(text(statement))
+
+
+@contextmanager
+def capture_statements() -> Iterator[List[Any]]:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def scans(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for subplan in plan.get('Plans', []):
+        yield from scans(subplan)
+
+
+async def assert_index_scans(db, statements, table: str, *indexes: str):
+    connection = await db.connection()
+    # The empty partitions made ahead of time are scanned sequentially, which costs nothing
+    results = await connection.exec_driver_sql(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND relpages > 0"
+    )
+    non_empty_tables = set(results.scalars())
+
+    for statement, parameters in statements:
+        results = await connection.exec_driver_sql(
+            f'EXPLAIN (FORMAT JSON) {statement}', parameters
+        )
+        plan = results.scalar_one()[0]['Plan']
+        nodes = list(scans(plan))
+        # The scans of a partitioned table are done on its partitions and their indexes
+        table_scans = [node for node in nodes if node.get('Relation Name', '').startswith(table)]
+
+        assert table_scans, plan
+        assert not any(
+            node['Node Type'] == 'Seq Scan' and node['Relation Name'] in non_empty_tables
+            for node in table_scans
+        ), plan
+        assert any(
+            index in node.get('Index Name', '') for node in nodes for index in indexes
+        ), plan
+
+
+async def test_redirect_lookup_uses_index(seeded_db):
+    db, _, _ = seeded_db
+    with capture_statements() as statements:
+        await short_link_crud.get_fields(db=db, fields=('id', 'original_url'), short_url='plan-42')
+
+    await assert_index_scans(db, statements, 'short_link', 'short_link_short_url_key')
+
+
+async def test_statistic_page_uses_index(seeded_db):
+    db, short_link_id, _ = seeded_db
+    with capture_statements() as statements:
+        await access_log_crud.get_multi(
+            db=db,
+            after_id=0,
+            limit=10,
+            options=[joinedload(AccessLog.user_agent), joinedload(AccessLog.referer)],
+            short_link_id=short_link_id
+        )
+        await access_log_crud.count(db=db, short_link_id=short_link_id)
+        await click_counter_crud.get_total(db=db, short_link_id=short_link_id)
+
+    await assert_index_scans(
+        db, statements[:2], 'access_log',
+        'short_link_id_id', 'short_link_id_create_at'
+    )
+    await assert_index_scans(db, statements[2:], 'link_click_total', 'link_click_total_pkey')
+
+
+async def test_user_links_use_partial_index(seeded_db):
+    db, _, owner_id = seeded_db
+    with capture_statements() as statements:
+        await short_link_crud.get_multi(db=db, owner_id=owner_id, is_active=True)
+
+    await assert_index_scans(db, statements, 'short_link', 'ix_short_link_owner_id_id_active')
+
+
+async def test_user_links_page_uses_partial_index(seeded_db):
+    db, _, owner_id = seeded_db
+    with capture_statements() as statements:
+        await short_link_crud.get_page(
+            db=db, fields=('id', 'short_url'), after_id=0, limit=100, with_clicks=True,
+            owner_id=owner_id, is_active=True
+        )
+
+    await assert_index_scans(db, statements, 'short_link', 'ix_short_link_owner_id_id_active')
@@ -0,0 +1,100 @@
+import pytest
+from fastapi import HTTPException, status
+from httpx import AsyncClient
+
+from core.config import app_settings
+from main import app
+from services.metrics import registry
+from services.rate_limit import MemoryRateLimitBackend, RateLimiter, rate_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    backend = MemoryRateLimitBackend(max_buckets=100, clock=clock)
+
+    assert [backend.take('a', rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert backend.take('a', rate=2, burst=3) == pytest.approx(0.5)
+    assert backend.take('b', rate=2, burst=3) == 0
+
+    clock.now = 0.5
+    assert backend.take('a', rate=2, burst=3) == 0
+    assert backend.take('a', rate=2, burst=3) > 0
+
+
+def test_idle_and_least_recently_used_buckets_are_evicted():
+    clock = FakeClock()
+    backend = MemoryRateLimitBackend(max_buckets=2, clock=clock)
+
+    backend.take('a', rate=1, burst=10)
+    backend.take('b', rate=1, burst=10)
+    backend.take('c', rate=1, burst=10)
+    assert backend.stats() == {'buckets': 2, 'max_buckets': 2, 'evictions': 1}
+
+    # The full buckets are dropped without counting an eviction
+    clock.now = 10
+    backend.take('d', rate=1, burst=10)
+    assert backend.stats() == {'buckets': 1, 'max_buckets': 2, 'evictions': 1}
+
+
+async def test_limits_per_key_kind(event_loop):
+    limiter = RateLimiter(
+        backend=MemoryRateLimitBackend(max_buckets=100),
+        limits={'test': {'client': (0.1, 2), 'link': (0.1, 3)}},
+    )
+
+    await limiter.check('test', {'client': 'alice', 'link': 'abc'})
+    await limiter.check('test', {'client': 'alice', 'link': 'abc'})
+    with pytest.raises(HTTPException) as exc_info:
+        await limiter.check('test', {'client': 'alice', 'link': 'abc'})
+    assert exc_info.value.headers == {'Retry-After': '10'}
+
+    await limiter.check('test', {'client': 'bob', 'link': 'abc'})
+    with pytest.raises(HTTPException):
+        await limiter.check('test', {'client': 'carol', 'link': 'abc'})
+    await limiter.check('unlimited', {'client': 'alice'})
+    assert limiter.stats()['throttled'] == {'test:client': 1, 'test:link': 1}
+
+
+async def test_redirect_is_throttled(monkeypatch, event_loop):
+    monkeypatch.setitem(rate_limiter.limits, 'redirect', {'link': (0.01, 2)})
+
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        for _ in range(2):
+            response = await ac.get('/throttled-link')
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = await ac.get('/throttled-link')
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers['Retry-After'] == '100'
+
+    assert registry.get_sample_value(
+        'http_throttled_requests_total', {'limit': 'redirect', 'key': 'link'}
+    ) >= 1
+
+
+async def test_proxied_clients_are_limited_apart(monkeypatch, event_loop):
+    monkeypatch.setattr(app_settings, 'trust_forwarded_headers', True)
+    monkeypatch.setitem(rate_limiter.limits, 'redirect', {'ip': (0.01, 1)})
+
+    async with AsyncClient(app=app, base_url='http://test') as ac:
+        response = await ac.get('/proxied-link', headers={'x-real-ip': '203.0.113.1'})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        # Only the last entry is added by the proxy, the first one is forged by the client
+        response = await ac.get('/proxied-link', headers={
+            'x-forwarded-for': '198.51.100.7, 203.0.113.1'
+        })
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        response = await ac.get('/proxied-link', headers={'x-real-ip': '203.0.113.2'})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = await ac.get('/api/v1/rate-limit')
+        assert response.json()['throttled']['redirect:ip'] >= 1
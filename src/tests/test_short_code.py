@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from db.db import engine
+from models.general import short_code_sequence
+from services.short_code import (BASE, HiLoShortCodeGenerator, ShortCodeEncoder,
+                                 SnowflakeShortCodeGenerator, build_short_code_generator)
+
+
+def test_encoder_is_bijective_and_grows():
+    encoder = ShortCodeEncoder(min_length=2)
+    codes = [encoder.encode(number) for number in range(BASE ** 2)]
+
+    assert len(set(codes)) == BASE ** 2
+    assert all(len(code) == 2 for code in codes)
+    assert codes[:2] != ['00', '01']
+    assert len(encoder.encode(BASE ** 2)) == 3
+
+
+async def test_hilo_generator_leases_blocks(event_loop):
+    generator = HiLoShortCodeGenerator(
+        engine=engine, encoder=ShortCodeEncoder(min_length=7), sequence=short_code_sequence.name
+    )
+    codes = await asyncio.gather(*(generator.generate() for _ in range(2500)))
+
+    assert len(set(codes)) == 2500
+    assert all(len(code) == 7 for code in codes)
+    assert generator.leased_blocks == 3
+
+
+async def test_snowflake_generator_is_unique_across_workers(event_loop):
+    encoder = ShortCodeEncoder(min_length=7)
+    epoch = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    generators = [
+        SnowflakeShortCodeGenerator(encoder=encoder, worker_id=worker_id, epoch=epoch)
+        for worker_id in range(2)
+    ]
+    codes = await asyncio.gather(*(
+        generator.generate() for generator in generators for _ in range(5000)
+    ))
+
+    assert len(set(codes)) == 10000
+
+
+def test_snowflake_generator_needs_worker_id(mocker):
+    mocker.patch('services.short_code.app_settings.short_code_worker_id', None)
+    with pytest.raises(ValueError):
+        build_short_code_generator('snowflake')